@@ -3,21 +3,186 @@ Módulo de integración con Claude AI (Anthropic) para análisis inteligente de
 Proporciona análisis geométrico avanzado y sugerencias para avalúos inmobiliarios.
 """
 
+from __future__ import annotations
+
 import os
 import json
-from typing import Dict, List, Optional
-from anthropic import Anthropic
+import math
+import time
+import asyncio
+import copy
+import hashlib
+import threading
+from datetime import datetime
+from collections import Counter, OrderedDict
+from collections.abc import Callable
+import httpx
+from anthropic import (
+    Anthropic, AsyncAnthropic, APIConnectionError, RateLimitError,
+    DefaultHttpxClient, DefaultAsyncHttpxClient
+)
 from geometry_utils import GeometryUtils
 from dotenv import load_dotenv
 
 
+# Partes fijas del prompt: encabezado antes de los datos del plano e
+# instrucciones de formato después
+_PROMPT_HEADER = """Eres un experto en análisis de planos arquitectónicos y avalúos inmobiliarios.
+
+Analiza el siguiente plano de un inmueble con base en sus características geométricas:
+
+"""
+
+_PROMPT_SECTIONS = """
+Proporciona un análisis estructurado en las siguientes secciones:
+
+1. **RESUMEN EJECUTIVO**: Descripción general del inmueble (2-3 líneas)
+
+2. **ANÁLISIS GEOMÉTRICO**: Evalúa la forma, regularidad y características del plano
+"""
+
+_PROMPT_CLOSING = "\nSé específico, profesional y enfocado en avalúos inmobiliarios."
+
+_PROMPT_INSTRUCTIONS_WITH_ZONES = _PROMPT_SECTIONS + """
+3. **DISTRIBUCIÓN DE ESPACIOS**: Analiza la distribución de zonas/habitaciones:
+   - Proporción de áreas por tipo de espacio
+   - Funcionalidad de la distribución
+   - Comparación con estándares de mercado
+   - Recomendaciones sobre distribución
+
+4. **INCONSISTENCIAS DETECTADAS**: Lista y explica los problemas encontrados
+
+5. **IMPACTO EN AVALÚO**: Cómo estas características afectan el valor del inmueble
+
+6. **RECOMENDACIONES**: Sugerencias específicas para corrección o documentación
+""" + _PROMPT_CLOSING
+
+_PROMPT_INSTRUCTIONS_NO_ZONES = _PROMPT_SECTIONS + """
+3. **INCONSISTENCIAS DETECTADAS**: Lista y explica los problemas encontrados
+
+4. **IMPACTO EN AVALÚO**: Cómo estas características afectan el valor del inmueble
+
+5. **RECOMENDACIONES**: Sugerencias específicas para corrección o documentación
+""" + _PROMPT_CLOSING
+
+# Plantillas de la parte variable del prompt (datos del plano)
+_PLAN_MEASUREMENTS_TEMPLATE = """**MEDIDAS GENERALES:**
+- Área total: {area_m2} m²
+- Perímetro: {perimeter_m} m
+- Número de líneas/muros: {num_lines}
+- Polígono cerrado: {closed}"""
+
+_PLAN_CLOSURE_GAP_TEMPLATE = """
+- Distancia de cierre: {closure_gap_m} m (gap entre inicio y fin)"""
+
+_PLAN_GEOMETRY_TEMPLATE = """
+- Índice de regularidad: {regularity_index} (0-1, donde 1 es muy regular)
+
+**GEOMETRÍA:**
+- Líneas paralelas detectadas: {parallel_pairs} pares
+- Líneas perpendiculares: {perpendicular_pairs} pares
+- Ángulos irregulares: {irregular_angles_count}
+"""
+
+_PLAN_ZONES_TEMPLATE = """
+**DISTRIBUCIÓN POR ZONAS/HABITACIONES:**
+- Total de zonas definidas: {total_zones}
+- Zonas válidas (cerradas): {valid_zones}
+- Área total de zonas: {total_area} m²
+
+Desglose por tipo de zona:
+"""
+
+_PLAN_ISSUES_TEMPLATE = """
+**PROBLEMAS DETECTADOS:**
+- Total de sugerencias: {suggestions}
+- Severidad alta: {high}
+- Severidad media: {medium}
+"""
+
+# Fragmentos fijos del reporte formateado; solo se rellenan los valores variables
+_REPORT_BANNER = "═" * 63
+_REPORT_SEP = "━" * 59 + "\n\n"
+
+_REPORT_HEADER = f"""
+{_REPORT_BANNER}
+            REPORTE DE ANÁLISIS DE PLANO - AVALÚO
+{_REPORT_BANNER}
+
+"""
+
+_REPORT_MEASUREMENTS = """📐 MEDICIONES PRINCIPALES
+
+  • Área total:        {area} m²
+  • Perímetro:         {perimeter} m
+  • Número de muros:   {num_lines}
+  • Polígono cerrado:  {closed}"""
+
+_REPORT_ZONES = "\n" + _REPORT_SEP + """🏠 DISTRIBUCIÓN POR ZONAS/HABITACIONES
+
+  • Total de zonas:    {total}
+  • Zonas válidas:     {valid}
+  • Área de zonas:     {area} m²
+
+  Desglose por tipo:
+"""
+
+_REPORT_ANALYSIS = "\n" + _REPORT_SEP + """🔍 ANÁLISIS GEOMÉTRICO
+
+  • Líneas paralelas:       {parallel} pares
+  • Líneas perpendiculares: {perpendicular} pares
+  • Ángulos irregulares:    {irregular}
+
+""" + _REPORT_SEP + """⚠️  PROBLEMAS DETECTADOS
+
+  Total de sugerencias: {suggestions}
+  
+  Severidad:
+    🔴 Alta:   {high}
+    🟡 Media:  {medium}
+    🟢 Baja:   {low}
+
+""" + _REPORT_SEP + """🤖 ANÁLISIS INTELIGENTE CON IA (Claude)
+
+{claude}
+
+""" + _REPORT_SEP + """Modelo: {model}
+
+""" + _REPORT_BANNER + "\n"
+
+
 class ClaudeAnalyzer:
     """
     Analizador inteligente de planos usando Claude AI.
     Proporciona análisis geométrico, detección de inconsistencias y sugerencias.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    # Reintentos ante límites de tasa o fallos de conexión
+    MAX_RETRIES = 3
+    RETRY_BASE_DELAY = 1.0  # Segundos; se duplica en cada reintento
+    
+    # Límite de tokens de salida según las secciones que se piden a Claude. Es solo
+    # un tope (no se cobra lo que no se genera): nunca por debajo de los 2000 que
+    # se usaban para todo, y con margen extra para la sección de distribución de
+    # zonas. Una respuesta que aun así se corte se marca como incompleta.
+    MAX_TOKENS_NO_ZONES = 2000
+    MAX_TOKENS_WITH_ZONES = 3000
+    
+    # Máximo de resultados geométricos memorizados (uno por geometría distinta)
+    LOCAL_CACHE_SIZE = 64
+    
+    # Pool de conexiones HTTP compartido por todas las peticiones del analizador
+    HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+    
+    # Directorio donde se guardan las respuestas de Claude ya obtenidas
+    RESPONSE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.drawingapp', 'claude_cache')
+    # Las respuestas guardadas caducan y el directorio no pasa de cierto número
+    # de archivos (se borran los más antiguos)
+    RESPONSE_CACHE_MAX_AGE = 7 * 24 * 3600  # Segundos
+    RESPONSE_CACHE_MAX_FILES = 200
+    
+    def __init__(self, api_key: str | None = None):
         """
         Inicializa el analizador con la API key de Claude.
         
@@ -32,14 +197,64 @@ class ClaudeAnalyzer:
                 "Por favor, edita el archivo .env y configura CLAUDE_API_KEY con tu clave real."
             )
         
-        self.client = Anthropic(api_key=self.api_key)
+        # Clientes HTTP explícitos para reutilizar conexiones entre peticiones
+        self.client = Anthropic(
+            api_key=self.api_key,
+            http_client=DefaultHttpxClient(limits=self.HTTP_LIMITS, timeout=self.HTTP_TIMEOUT)
+        )
+        # Cliente asíncrono para no bloquear el hilo mientras Claude responde. Sin
+        # reintentos propios: _acreate_with_retry es la única política de reintento
+        self.aclient = AsyncAnthropic(
+            api_key=self.api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=self.HTTP_LIMITS, timeout=self.HTTP_TIMEOUT)
+        )
+        self._aclient_used = False  # Si el cliente asíncrono ya abrió conexiones (ver close)
         # Usar Claude Sonnet 4.5 - versión más reciente disponible
         # Alias: claude-sonnet-4-5 (apunta automáticamente a la versión más nueva)
         # Versión específica: claude-sonnet-4-5-20250929
         self.model = "claude-sonnet-4-5"
         self.geo_utils = GeometryUtils()
+        self._local_cache = OrderedDict()
+        # El análisis local puede ejecutarse en hilos (ver aanalyze_floor_plan)
+        self._local_cache_lock = threading.Lock()
     
-    def analyze_floor_plan(self, lines: List[Dict], scale: float = 50, zones: List[Dict] = None) -> Dict:
+    def close(self):
+        """
+        Libera las conexiones HTTP del cliente síncrono y, si nunca se usó, las
+        del asíncrono.
+        
+        Un cliente asíncrono ya usado tiene conexiones ligadas a su bucle de
+        eventos: en ese caso hay que llamar a `aclose()` desde ese bucle.
+        """
+        self.client.close()
+        if not self._aclient_used:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # Sin bucle activo: su pool está vacío y se cierra en uno temporal
+                asyncio.run(self.aclient.close())
+    
+    async def aclose(self):
+        """Libera las conexiones HTTP de ambos clientes."""
+        self.client.close()
+        await self.aclient.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+    
+    def analyze_floor_plan(self, lines: list[dict], scale: float = 50, zones: list[dict] | None = None,
+                           on_text: Callable[[str], None] | None = None,
+                           force_refresh: bool = False) -> dict:
         """
         Analiza un plano completo y genera un reporte detallado.
         
@@ -47,6 +262,9 @@ class ClaudeAnalyzer:
             lines: Lista de líneas del plano con 'start', 'end' y 'length'
             scale: Escala de píxeles a metros
             zones: Lista opcional de zonas/habitaciones con sus áreas
+            on_text: Callback opcional que recibe el texto de Claude a medida que
+                     se genera, para mostrarlo sin esperar la respuesta completa
+            force_refresh: Ignorar la respuesta guardada y volver a consultar a Claude
         
         Returns:
             Diccionario con análisis completo y recomendaciones
@@ -55,19 +273,134 @@ class ClaudeAnalyzer:
         local_analysis = self._perform_local_analysis(lines, scale, zones)
         
         # Enviar a Claude para análisis inteligente
-        claude_analysis = self._get_claude_analysis(local_analysis, zones)
+        claude_analysis = self._get_claude_analysis(local_analysis, zones, on_text, force_refresh)
         
         # Combinar resultados
+        return self._combine_results(local_analysis, claude_analysis)
+    
+    async def aanalyze_floor_plan(self, lines: list[dict], scale: float = 50, zones: list[dict] | None = None,
+                                  force_refresh: bool = False) -> dict:
+        """
+        Versión asíncrona de `analyze_floor_plan`.
+        
+        El análisis geométrico local se ejecuta en un hilo y la llamada a Claude
+        se espera con `await`, de modo que el llamador puede solapar varias
+        peticiones o continuar con otro trabajo mientras tanto.
+        
+        Args:
+            lines: Lista de líneas del plano con 'start', 'end' y 'length'
+            scale: Escala de píxeles a metros
+            zones: Lista opcional de zonas/habitaciones con sus áreas
+            force_refresh: Ignorar la respuesta guardada y volver a consultar a Claude
+        
+        Returns:
+            Diccionario con análisis completo y recomendaciones
+        """
+        local_analysis = await asyncio.to_thread(self._perform_local_analysis, lines, scale, zones)
+        claude_analysis = await self._aget_claude_analysis(local_analysis, zones, force_refresh)
+        return self._combine_results(local_analysis, claude_analysis)
+    
+    def analyze_floor_plans_batch(self, plans: list[tuple[list[dict], float, list[dict] | None]],
+                                  poll_interval: float = 30.0) -> list[dict]:
+        """
+        Analiza varios planos mediante la API de Message Batches de Anthropic.
+        
+        Pensado para generación de reportes fuera de línea: los lotes cuestan
+        ~50% menos que las llamadas individuales a cambio de resolverse de forma
+        asíncrona (hasta 24 h).
+        
+        Args:
+            plans: Lista de tuplas (lines, scale, zones) con un plano cada una
+            poll_interval: Segundos entre consultas del estado del lote
+        
+        Returns:
+            Lista de análisis en el mismo orden que `plans`, con el mismo formato
+            que `analyze_floor_plan`
+        """
+        if not plans:
+            return []
+        
+        # El análisis local se calcula antes de enviar el lote
+        local_analyses = []
+        requests = []
+        for i, (lines, scale, zones) in enumerate(plans):
+            local_analysis = self._perform_local_analysis(lines, scale, zones)
+            local_analyses.append(local_analysis)
+            
+            prompt = self._build_analysis_prompt(local_analysis, zones)
+            requests.append({
+                'custom_id': f"plano-{i}",
+                'params': self._build_message_params(prompt, bool(zones))
+            })
+        
+        claude_results = {}
+        batch_error = None
+        
+        try:
+            batch = self.client.messages.batches.create(requests=requests)
+            
+            while batch.processing_status != "ended":
+                time.sleep(poll_interval)
+                batch = self.client.messages.batches.retrieve(batch.id)
+            
+            for entry in self.client.messages.batches.results(batch.id):
+                if entry.result.type == "succeeded":
+                    claude_results[entry.custom_id] = self._parse_claude_response(entry.result.message)
+                else:
+                    claude_results[entry.custom_id] = self._build_error_response(
+                        Exception(f"Petición del lote sin resultado ({entry.result.type})")
+                    )
+        
+        except Exception as e:
+            batch_error = self._build_error_response(e)
+        
+        results = []
+        for i, local_analysis in enumerate(local_analyses):
+            claude_analysis = claude_results.get(f"plano-{i}") or batch_error or self._build_error_response(
+                Exception("El lote no devolvió resultado para este plano")
+            )
+            results.append(self._combine_results(local_analysis, claude_analysis))
+        
+        return results
+    
+    async def analyze_many(self, jobs: list[tuple[list[dict], float, list[dict] | None]],
+                           concurrency: int = 5) -> list[dict]:
+        """
+        Analiza varios planos en paralelo limitando las llamadas simultáneas.
+        
+        El semáforo solo limita las llamadas a Claude: el análisis geométrico de
+        los planos siguientes avanza en hilos mientras hay peticiones en vuelo.
+        
+        Args:
+            jobs: Lista de tuplas (lines, scale, zones) con un plano cada una
+            concurrency: Máximo de peticiones a Claude en vuelo a la vez
+        
+        Returns:
+            Lista de análisis en el mismo orden que `jobs`
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_one(lines, scale, zones):
+            local_analysis = await asyncio.to_thread(self._perform_local_analysis, lines, scale, zones)
+            async with semaphore:
+                claude_analysis = await self._aget_claude_analysis(local_analysis, zones)
+            return self._combine_results(local_analysis, claude_analysis)
+        
+        return await asyncio.gather(*(run_one(*job) for job in jobs))
+    
+    def _combine_results(self, local_analysis: dict, claude_analysis: dict) -> dict:
+        """Combina el análisis local con la respuesta de Claude."""
         return {
             'measurements': local_analysis['measurements'],
             'geometry': local_analysis['geometry'],
             'issues': local_analysis['issues'],
             'zones': local_analysis.get('zones'),
             'claude_insights': claude_analysis,
-            'timestamp': self._get_timestamp()
+            'timestamp': self._get_timestamp(),
+            '_debug': local_analysis.get('_debug')
         }
     
-    def _perform_local_analysis(self, lines: List[Dict], scale: float, zones: List[Dict] = None) -> Dict:
+    def _perform_local_analysis(self, lines: list[dict], scale: float, zones: list[dict] | None = None) -> dict:
         """
         Realiza análisis geométrico local sin usar la API.
         
@@ -79,6 +412,44 @@ class ClaudeAnalyzer:
         Returns:
             Diccionario con resultados del análisis local
         """
+        # La geometría solo depende de las líneas y la escala; si no cambió
+        # (p. ej. solo se editaron zonas) se reutiliza el cálculo anterior
+        key = (scale, tuple(
+            (tuple(line['start']), tuple(line['end']), line.get('length', 0)) for line in lines
+        ))
+        with self._local_cache_lock:
+            geometry_analysis = self._local_cache.get(key)
+            if geometry_analysis is not None:
+                self._local_cache.move_to_end(key)
+        
+        if geometry_analysis is None:
+            geometry_analysis = self._compute_geometry_analysis(lines, scale)
+            with self._local_cache_lock:
+                self._local_cache[key] = geometry_analysis
+                if len(self._local_cache) > self.LOCAL_CACHE_SIZE:
+                    self._local_cache.popitem(last=False)
+        
+        # Copia profunda: quien reciba el análisis puede modificarlo sin alterar
+        # el resultado guardado en el caché para los siguientes aciertos
+        result = copy.deepcopy(geometry_analysis)
+        
+        # Procesar información de zonas si está disponible
+        if zones:
+            result['zones'] = self._process_zones_info(zones)
+        
+        return result
+    
+    def _compute_geometry_analysis(self, lines: list[dict], scale: float) -> dict:
+        """
+        Calcula mediciones, geometría y problemas de un conjunto de líneas.
+        
+        Args:
+            lines: Lista de líneas
+            scale: Escala
+        
+        Returns:
+            Diccionario con las secciones 'measurements', 'geometry' e 'issues'
+        """
         # Convertir coordenadas de píxeles a metros
         lines_in_meters = self._convert_to_meters(lines, scale)
         
@@ -86,25 +457,22 @@ class ClaudeAnalyzer:
         area = self.geo_utils.calculate_polygon_area(lines_in_meters)
         perimeter = self.geo_utils.calculate_perimeter(lines)
         is_closed = self.geo_utils.detect_closed_polygon(lines_in_meters, tolerance=0.5)
-        regularity = self.geo_utils.calculate_shape_regularity(lines)
+        # Los ángulos se calculan una vez y se comparten entre todos los detectores
+        angles = self.geo_utils._get_line_angles(lines)
+        regularity = self.geo_utils.calculate_shape_regularity(lines, angles=angles)
         
         # Calcular distancia de cierre para diagnóstico
         closure_gap = self._calculate_closure_gap(lines_in_meters)
         
         # Detección de patrones
-        parallel_lines = self.geo_utils.detect_parallel_lines(lines)
-        perpendicular_lines = self.geo_utils.detect_perpendicular_lines(lines)
-        irregular_angles = self.geo_utils.detect_irregular_angles(lines)
+        parallel_lines = self.geo_utils.detect_parallel_lines(lines, angles=angles)
+        perpendicular_lines = self.geo_utils.detect_perpendicular_lines(lines, angles=angles)
+        irregular_angles = self.geo_utils.detect_irregular_angles(lines, angles=angles)
         
         # Sugerencias de corrección
-        suggestions = self.geo_utils.suggest_corrections(lines, scale)
+        suggestions = self.geo_utils.suggest_corrections(lines, scale, angles=angles)
         
-        # Procesar información de zonas si está disponible
-        zones_info = None
-        if zones:
-            zones_info = self._process_zones_info(zones)
-        
-        result = {
+        return {
             'measurements': {
                 'area_m2': round(area, 2),
                 'perimeter_m': round(perimeter, 2),
@@ -116,61 +484,221 @@ class ClaudeAnalyzer:
             'geometry': {
                 'parallel_pairs': len(parallel_lines),
                 'perpendicular_pairs': len(perpendicular_lines),
-                'irregular_angles_count': len(irregular_angles),
-                'irregular_angles_details': irregular_angles
+                'irregular_angles_count': len(irregular_angles)
             },
             'issues': {
                 'suggestions': suggestions,
                 'has_issues': len(suggestions) > 0,
                 'severity_counts': self._count_severities(suggestions)
+            },
+            # Detalle para diagnóstico; no forma parte del prompt
+            '_debug': {
+                'irregular_angles_details': irregular_angles
             }
         }
-        
-        if zones_info:
-            result['zones'] = zones_info
-        
-        return result
     
-    def _get_claude_analysis(self, local_analysis: Dict, zones: List[Dict] = None) -> Dict:
+    def _get_claude_analysis(self, local_analysis: dict, zones: list[dict] | None = None,
+                             on_text: Callable[[str], None] | None = None,
+                             force_refresh: bool = False) -> dict:
         """
         Envía los datos a Claude para obtener análisis inteligente.
         
         Args:
             local_analysis: Resultados del análisis local
             zones: Lista opcional de zonas
+            on_text: Callback opcional para recibir la respuesta en streaming
+            force_refresh: Ignorar la respuesta guardada en disco
         
         Returns:
             Respuesta procesada de Claude
         """
         prompt = self._build_analysis_prompt(local_analysis, zones)
+        params = self._build_message_params(prompt, bool(zones))
+        cache_key = self._response_cache_key(params)
+        
+        if not force_refresh:
+            cached = self._load_cached_response(cache_key)
+            if cached is not None:
+                if on_text is not None:
+                    on_text(cached['analysis'])
+                return cached
         
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                temperature=0.3,  # Baja temperatura para respuestas más precisas
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
+            if on_text is None:
+                message = self.client.messages.create(**params)
+            else:
+                # Entregar el texto conforme llega en lugar de esperar al final
+                with self.client.messages.stream(**params) as stream:
+                    for text in stream.text_stream:
+                        on_text(text)
+                    message = stream.get_final_message()
             
-            response_text = message.content[0].text
+            result = self._parse_claude_response(message)
+            self._store_cached_response(cache_key, result)
+            return result
             
-            return {
-                'analysis': response_text,
-                'success': True,
-                'model_used': self.model
-            }
+        except Exception as e:
+            return self._build_error_response(e)
+    
+    async def _aget_claude_analysis(self, local_analysis: dict, zones: list[dict] | None = None,
+                                    force_refresh: bool = False) -> dict:
+        """
+        Versión asíncrona de `_get_claude_analysis` usando `AsyncAnthropic`.
+        
+        Args:
+            local_analysis: Resultados del análisis local
+            zones: Lista opcional de zonas
+            force_refresh: Ignorar la respuesta guardada en disco
+        
+        Returns:
+            Respuesta procesada de Claude
+        """
+        prompt = self._build_analysis_prompt(local_analysis, zones)
+        params = self._build_message_params(prompt, bool(zones))
+        cache_key = self._response_cache_key(params)
+        
+        if not force_refresh:
+            cached = self._load_cached_response(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            message = await self._acreate_with_retry(params)
+            result = self._parse_claude_response(message)
+            self._store_cached_response(cache_key, result)
+            return result
             
         except Exception as e:
+            return self._build_error_response(e)
+    
+    async def _acreate_with_retry(self, params: dict):
+        """
+        Llama a `messages.create` reintentando con backoff exponencial.
+        
+        Args:
+            params: Argumentos para `messages.create`
+        
+        Returns:
+            Mensaje devuelto por Claude
+        """
+        self._aclient_used = True
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                return await self.aclient.messages.create(**params)
+            except (RateLimitError, APIConnectionError):
+                if attempt == self.MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(self.RETRY_BASE_DELAY * (2 ** attempt))
+    
+    def _response_cache_key(self, params: dict) -> str:
+        """
+        Calcula la clave de caché de una petición a Claude.
+        
+        Args:
+            params: Argumentos de `messages.create` (modelo, prompt, temperatura...)
+        
+        Returns:
+            Hash hexadecimal que identifica la petición
+        """
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _load_cached_response(self, cache_key: str) -> dict | None:
+        """Lee una respuesta de Claude guardada en disco, o None si no existe o caducó."""
+        path = os.path.join(self.RESPONSE_CACHE_DIR, f"{cache_key}.json")
+        try:
+            if time.time() - os.path.getmtime(path) > self.RESPONSE_CACHE_MAX_AGE:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Cachés escritos antes de filtrar respuestas fallidas o incompletas
+        return cached if cached.get('success') else None
+    
+    def _store_cached_response(self, cache_key: str, response: dict):
+        """Guarda en disco una respuesta exitosa de Claude (las fallidas se descartan)."""
+        if not response.get('success'):
+            return
+        path = os.path.join(self.RESPONSE_CACHE_DIR, f"{cache_key}.json")
+        try:
+            os.makedirs(self.RESPONSE_CACHE_DIR, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(response, f, ensure_ascii=False)
+            self._prune_response_cache()
+        except OSError:
+            # El caché es opcional; un fallo al escribir no afecta el análisis
+            pass
+    
+    def _prune_response_cache(self):
+        """Borra las respuestas guardadas más antiguas si se superó el máximo de archivos."""
+        entries = [
+            entry for entry in os.scandir(self.RESPONSE_CACHE_DIR)
+            if entry.is_file() and entry.name.endswith('.json')
+        ]
+        excess = len(entries) - self.RESPONSE_CACHE_MAX_FILES
+        if excess <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def _build_message_params(self, prompt: str, with_zones: bool = False) -> dict:
+        """
+        Construye los parámetros de la petición a la API de mensajes.
+        
+        Args:
+            prompt: Prompt ya construido para Claude
+            with_zones: Si el prompt incluye la sección de distribución de zonas
+        
+        Returns:
+            Diccionario de argumentos para `messages.create`
+        """
+        return {
+            'model': self.model,
+            'max_tokens': self.MAX_TOKENS_WITH_ZONES if with_zones else self.MAX_TOKENS_NO_ZONES,
+            'temperature': 0.3,  # Baja temperatura para respuestas más precisas
+            'messages': [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+    
+    def _parse_claude_response(self, message) -> dict:
+        """Extrae el texto de la respuesta de Claude."""
+        response_text = message.content[0].text
+        
+        # Una respuesta cortada por el límite de tokens no es un análisis válido:
+        # se devuelve como fallida para que nadie la guarde en caché
+        if message.stop_reason == "max_tokens":
+            error = "La respuesta de Claude se cortó al alcanzar el límite de tokens"
             return {
-                'analysis': f"Error al conectar con Claude: {str(e)}",
+                'analysis': f"{response_text}\n\n[{error}; el análisis está incompleto]",
                 'success': False,
-                'error': str(e)
+                'truncated': True,
+                'error': error,
+                'model_used': self.model
             }
+        
+        return {
+            'analysis': response_text,
+            'success': True,
+            'model_used': self.model
+        }
     
-    def _build_analysis_prompt(self, local_analysis: Dict, zones: List[Dict] = None) -> str:
+    def _build_error_response(self, error: Exception) -> dict:
+        """Construye la respuesta de error cuando falla la llamada a Claude."""
+        return {
+            'analysis': f"Error al conectar con Claude: {str(error)}",
+            'success': False,
+            'error': str(error)
+        }
+    
+    def _build_analysis_prompt(self, local_analysis: dict, zones: list[dict] | None = None) -> str:
         """
         Construye el prompt para Claude basado en el análisis local.
         
@@ -181,95 +709,59 @@ class ClaudeAnalyzer:
         Returns:
             Prompt formateado para Claude
         """
+        instructions = _PROMPT_INSTRUCTIONS_WITH_ZONES if zones else _PROMPT_INSTRUCTIONS_NO_ZONES
+        return _PROMPT_HEADER + self._build_plan_data(local_analysis, zones) + instructions
+    
+    def _build_plan_data(self, local_analysis: dict, zones: list[dict] | None = None) -> str:
+        """
+        Construye la parte variable del prompt con los datos del plano.
+        
+        Args:
+            local_analysis: Datos del análisis local
+            zones: Lista opcional de zonas
+        
+        Returns:
+            Texto con medidas, geometría, zonas y problemas detectados
+        """
         measurements = local_analysis['measurements']
         geometry = local_analysis['geometry']
         issues = local_analysis['issues']
         
-        prompt = f"""Eres un experto en análisis de planos arquitectónicos y avalúos inmobiliarios.
-
-Analiza el siguiente plano de un inmueble con base en sus características geométricas:
-
-**MEDIDAS GENERALES:**
-- Área total: {measurements['area_m2']} m²
-- Perímetro: {measurements['perimeter_m']} m
-- Número de líneas/muros: {measurements['num_lines']}
-- Polígono cerrado: {'Sí' if measurements['is_closed'] else 'No'}"""
-
+        values = {
+            **measurements,
+            **geometry,
+            'closed': 'Sí' if measurements['is_closed'] else 'No',
+            'suggestions': len(issues['suggestions']),
+            'high': issues['severity_counts'].get('high', 0),
+            'medium': issues['severity_counts'].get('medium', 0)
+        }
+        
+        parts = [_PLAN_MEASUREMENTS_TEMPLATE.format_map(values)]
+        
         # Agregar información del gap de cierre si el polígono no está cerrado
         if not measurements['is_closed'] and measurements.get('closure_gap_m') is not None:
-            gap = measurements['closure_gap_m']
-            prompt += f"""
-- Distancia de cierre: {gap} m (gap entre inicio y fin)"""
+            parts.append(_PLAN_CLOSURE_GAP_TEMPLATE.format_map(values))
+        
+        parts.append(_PLAN_GEOMETRY_TEMPLATE.format_map(values))
         
-        prompt += f"""
-- Índice de regularidad: {measurements['regularity_index']} (0-1, donde 1 es muy regular)
-
-**GEOMETRÍA:**
-- Líneas paralelas detectadas: {geometry['parallel_pairs']} pares
-- Líneas perpendiculares: {geometry['perpendicular_pairs']} pares
-- Ángulos irregulares: {geometry['irregular_angles_count']}
-"""
-
         # Agregar información de zonas si está disponible
         if zones and 'zones' in local_analysis:
             zones_data = local_analysis['zones']
-            prompt += f"""
-**DISTRIBUCIÓN POR ZONAS/HABITACIONES:**
-- Total de zonas definidas: {zones_data['total_zones']}
-- Zonas válidas (cerradas): {zones_data['valid_zones']}
-- Área total de zonas: {zones_data['total_area']} m²
-
-Desglose por tipo de zona:
-"""
+            parts.append(_PLAN_ZONES_TEMPLATE.format_map(zones_data))
+            
             for zone_type, info in zones_data['by_type'].items():
-                prompt += f"  • {zone_type.capitalize()}: {info['count']} zona(s), {info['total_area']:.2f} m²\n"
+                parts.append(f"  • {zone_type.capitalize()}: {info['count']} zona(s), {info['total_area']:.2f} m²\n")
             
-            prompt += "\nZonas individuales:\n"
+            parts.append("\nZonas individuales:\n")
             for zone in zones_data['zones_list']:
                 status = "✅" if zone['is_valid'] else "⚠️"
-                prompt += f"  {status} {zone['name']} ({zone['type']}): {zone['area']:.2f} m²\n"
-
-        prompt += f"""
-**PROBLEMAS DETECTADOS:**
-- Total de sugerencias: {len(issues['suggestions'])}
-- Severidad alta: {issues['severity_counts'].get('high', 0)}
-- Severidad media: {issues['severity_counts'].get('medium', 0)}
-
-Proporciona un análisis estructurado en las siguientes secciones:
-
-1. **RESUMEN EJECUTIVO**: Descripción general del inmueble (2-3 líneas)
-
-2. **ANÁLISIS GEOMÉTRICO**: Evalúa la forma, regularidad y características del plano
-"""
+                parts.append(f"  {status} {zone['name']} ({zone['type']}): {zone['area']:.2f} m²\n")
         
-        if zones:
-            prompt += """
-3. **DISTRIBUCIÓN DE ESPACIOS**: Analiza la distribución de zonas/habitaciones:
-   - Proporción de áreas por tipo de espacio
-   - Funcionalidad de la distribución
-   - Comparación con estándares de mercado
-   - Recomendaciones sobre distribución
-
-4. **INCONSISTENCIAS DETECTADAS**: Lista y explica los problemas encontrados
-
-5. **IMPACTO EN AVALÚO**: Cómo estas características afectan el valor del inmueble
-
-6. **RECOMENDACIONES**: Sugerencias específicas para corrección o documentación
-"""
-        else:
-            prompt += """
-3. **INCONSISTENCIAS DETECTADAS**: Lista y explica los problemas encontrados
-
-4. **IMPACTO EN AVALÚO**: Cómo estas características afectan el valor del inmueble
-
-5. **RECOMENDACIONES**: Sugerencias específicas para corrección o documentación
-"""
-
-        prompt += "\nSé específico, profesional y enfocado en avalúos inmobiliarios."
+        parts.append(_PLAN_ISSUES_TEMPLATE.format_map(values))
         
-        return prompt
+        return "".join(parts)
     
-    def _process_zones_info(self, zones: List[Dict]) -> Dict:
+    def _process_zones_info(self, zones: list[dict]) -> dict:
         """
         Procesa la información de zonas para el análisis.
         
@@ -280,23 +772,25 @@ Proporciona un análisis estructurado en las siguientes secciones:
             Diccionario con estadísticas de zonas procesadas
         """
         total_zones = len(zones)
-        valid_zones = sum(1 for z in zones if z.get('is_valid', False))
-        total_area = sum(z.get('area', 0) for z in zones if z.get('is_valid', False))
+        valid_zones = 0
+        total_area = 0
         
-        # Agrupar por tipo
+        # Una sola pasada: totales de zonas válidas y agrupación por tipo
         by_type = {}
         for zone in zones:
-            zone_type = zone.get('type', 'otro')
-            if zone_type not in by_type:
-                by_type[zone_type] = {
-                    'count': 0,
-                    'total_area': 0.0,
-                    'zones': []
-                }
+            area = zone.get('area', 0)
+            if zone.get('is_valid', False):
+                valid_zones += 1
+                total_area += area
             
-            by_type[zone_type]['count'] += 1
-            by_type[zone_type]['total_area'] += zone.get('area', 0)
-            by_type[zone_type]['zones'].append(zone.get('name', 'Sin nombre'))
+            type_info = by_type.setdefault(zone.get('type', 'otro'), {
+                'count': 0,
+                'total_area': 0.0,
+                'zones': []
+            })
+            type_info['count'] += 1
+            type_info['total_area'] += area
+            type_info['zones'].append(zone.get('name', 'Sin nombre'))
         
         return {
             'total_zones': total_zones,
@@ -309,7 +803,7 @@ Proporciona un análisis estructurado en las siguientes secciones:
     
     # Métodos auxiliares
     
-    def _calculate_closure_gap(self, lines: List[Dict]) -> Optional[float]:
+    def _calculate_closure_gap(self, lines: list[dict]) -> float | None:
         """
         Calcula la distancia de cierre del polígono (gap entre primer y último punto).
         
@@ -330,38 +824,27 @@ Proporciona un análisis estructurado en las siguientes secciones:
             first = vertices[0]
             last = vertices[-1]
             
-            import math
-            distance = math.sqrt((first[0] - last[0])**2 + (first[1] - last[1])**2)
+            distance = math.hypot(first[0] - last[0], first[1] - last[1])
             
             return distance
         except:
             return None
     
-    def _convert_to_meters(self, lines: List[Dict], scale: float) -> List[Dict]:
+    def _convert_to_meters(self, lines: list[dict], scale: float) -> list[dict]:
         """Convierte coordenadas de píxeles a metros."""
-        converted = []
-        for line in lines:
-            converted.append({
-                'start': (line['start'][0] / scale, line['start'][1] / scale),
-                'end': (line['end'][0] / scale, line['end'][1] / scale),
-                'length': line.get('length', 0)
-            })
-        return converted
+        return self.geo_utils.lines_to_meters(lines, scale)
     
-    def _count_severities(self, suggestions: List[Dict]) -> Dict[str, int]:
+    def _count_severities(self, suggestions: list[dict]) -> dict[str, int]:
         """Cuenta sugerencias por nivel de severidad."""
         counts = {'high': 0, 'medium': 0, 'low': 0}
-        for suggestion in suggestions:
-            severity = suggestion.get('severity', 'low')
-            counts[severity] = counts.get(severity, 0) + 1
+        counts.update(Counter(suggestion.get('severity', 'low') for suggestion in suggestions))
         return counts
     
     def _get_timestamp(self) -> str:
         """Obtiene timestamp actual."""
-        from datetime import datetime
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    def format_report(self, analysis: Dict) -> str:
+    def format_report(self, analysis: dict) -> str:
         """
         Formatea el análisis en un reporte legible.
         
@@ -377,86 +860,52 @@ Proporciona un análisis estructurado en las siguientes secciones:
         claude = analysis['claude_insights']
         zones = analysis.get('zones')
         
-        report = f"""
-═══════════════════════════════════════════════════════════════
-            REPORTE DE ANÁLISIS DE PLANO - AVALÚO
-═══════════════════════════════════════════════════════════════
-
-Fecha de análisis: {analysis['timestamp']}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📐 MEDICIONES PRINCIPALES
-
-  • Área total:        {measurements['area_m2']} m²
-  • Perímetro:         {measurements['perimeter_m']} m
-  • Número de muros:   {measurements['num_lines']}
-  • Polígono cerrado:  {'✓ Sí' if measurements['is_closed'] else '✗ No'}"""
-
+        parts = [
+            _REPORT_HEADER,
+            f"Fecha de análisis: {analysis['timestamp']}\n\n",
+            _REPORT_SEP,
+            _REPORT_MEASUREMENTS.format(
+                area=measurements['area_m2'],
+                perimeter=measurements['perimeter_m'],
+                num_lines=measurements['num_lines'],
+                closed='✓ Sí' if measurements['is_closed'] else '✗ No'
+            )
+        ]
+        
         # Agregar información del gap de cierre si está disponible
         if not measurements['is_closed'] and measurements.get('closure_gap_m') is not None:
-            gap = measurements['closure_gap_m']
-            report += f"""
-  • Gap de cierre:    {gap} m (espacio entre inicio y fin)"""
+            parts.append(f"\n  • Gap de cierre:    {measurements['closure_gap_m']} m (espacio entre inicio y fin)")
+        
+        parts.append(f"\n  • Regularidad:       {measurements['regularity_index']} / 1.00\n")
         
-        report += f"""
-  • Regularidad:       {measurements['regularity_index']} / 1.00
-"""
-
         # Agregar sección de zonas si están disponibles
         if zones:
-            report += f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏠 DISTRIBUCIÓN POR ZONAS/HABITACIONES
-
-  • Total de zonas:    {zones['total_zones']}
-  • Zonas válidas:     {zones['valid_zones']}
-  • Área de zonas:     {zones['total_area']} m²
-
-  Desglose por tipo:
-"""
+            parts.append(_REPORT_ZONES.format(
+                total=zones['total_zones'],
+                valid=zones['valid_zones'],
+                area=zones['total_area']
+            ))
             for zone_type, info in zones['by_type'].items():
-                report += f"    {zone_type.capitalize():15} {info['count']} zona(s)  |  {info['total_area']:.2f} m²\n"
+                parts.append(f"    {zone_type.capitalize():15} {info['count']} zona(s)  |  {info['total_area']:.2f} m²\n")
             
-            report += "\n  Detalle de zonas:\n"
+            parts.append("\n  Detalle de zonas:\n")
             for zone in zones['zones_list']:
                 status = "✅" if zone['is_valid'] else "⚠️"
-                report += f"    {status} {zone['name']:20} ({zone['type']:10}) {zone['area']:7.2f} m²\n"
-
-        report += f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔍 ANÁLISIS GEOMÉTRICO
-
-  • Líneas paralelas:       {geometry['parallel_pairs']} pares
-  • Líneas perpendiculares: {geometry['perpendicular_pairs']} pares
-  • Ángulos irregulares:    {geometry['irregular_angles_count']}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-⚠️  PROBLEMAS DETECTADOS
-
-  Total de sugerencias: {len(issues['suggestions'])}
-  
-  Severidad:
-    🔴 Alta:   {issues['severity_counts'].get('high', 0)}
-    🟡 Media:  {issues['severity_counts'].get('medium', 0)}
-    🟢 Baja:   {issues['severity_counts'].get('low', 0)}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🤖 ANÁLISIS INTELIGENTE CON IA (Claude)
-
-{claude['analysis'] if claude['success'] else '❌ ' + claude['analysis']}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Modelo: {claude.get('model_used', 'N/A')}
-
-═══════════════════════════════════════════════════════════════
-"""
-        return report
+                parts.append(f"    {status} {zone['name']:20} ({zone['type']:10}) {zone['area']:7.2f} m²\n")
+        
+        parts.append(_REPORT_ANALYSIS.format(
+            parallel=geometry['parallel_pairs'],
+            perpendicular=geometry['perpendicular_pairs'],
+            irregular=geometry['irregular_angles_count'],
+            suggestions=len(issues['suggestions']),
+            high=issues['severity_counts'].get('high', 0),
+            medium=issues['severity_counts'].get('medium', 0),
+            low=issues['severity_counts'].get('low', 0),
+            claude=claude['analysis'] if claude['success'] else '❌ ' + claude['analysis'],
+            model=claude.get('model_used', 'N/A')
+        ))
+        
+        return "".join(parts)
 
 
 # Función auxiliar para cargar variables de entorno desde .env
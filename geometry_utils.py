@@ -3,8 +3,34 @@ Utilidades para cálculos geométricos en planos de inmuebles.
 Proporciona funciones para análisis de áreas, perímetros y validaciones.
 """
 
+import bisect
 import math
-from typing import List, Tuple, Dict, Optional
+import operator
+from collections import defaultdict, namedtuple
+from typing import Callable, List, Tuple, Dict, Optional
+
+
+# Obtiene line.get('length', 0) desde C al usarse con map()
+_line_length = operator.methodcaller('get', 'length', 0)
+
+# Columnas paralelas (SoA) de una lista de líneas: coordenadas y longitudes
+_LineArrays = namedtuple('_LineArrays', ['sx', 'sy', 'ex', 'ey', 'length'])
+
+
+def _to_soa(lines: List[Dict]) -> _LineArrays:
+    """
+    Convierte la lista de diccionarios de líneas en columnas paralelas.
+    
+    Los cálculos por columna (map/sum sobre tuplas) evitan repetir los accesos
+    line['start'][0] en cada detector.
+    """
+    if not lines:
+        return _LineArrays((), (), (), (), ())
+    
+    sx, sy = zip(*[line['start'] for line in lines])
+    ex, ey = zip(*[line['end'] for line in lines])
+    length = tuple(map(_line_length, lines))
+    return _LineArrays(sx, sy, ex, ey, length)
 
 
 class GeometryUtils:
@@ -24,19 +50,26 @@ class GeometryUtils:
         if len(lines) < 3:
             return 0.0
         
+        return GeometryUtils._polygon_area(lines)
+    
+    @staticmethod
+    def _polygon_area(lines: List[Dict], tolerance: float = 15.0) -> float:
+        """
+        Núcleo de calculate_polygon_area en las unidades de las líneas.
+        `tolerance` es la distancia de unión de extremos al ordenar las líneas.
+        """
         # Extraer todos los vértices únicos en orden
-        vertices = GeometryUtils._extract_vertices(lines)
+        vertices = GeometryUtils._extract_vertices(lines, tolerance)
         
         if len(vertices) < 3:
             return 0.0
         
-        # Aplicar fórmula del trapecio
-        area = 0.0
-        n = len(vertices)
-        for i in range(n):
-            x1, y1 = vertices[i]
-            x2, y2 = vertices[(i + 1) % n]
-            area += (x1 * y2 - x2 * y1)
+        # Aplicar fórmula del trapecio como dos productos escalares:
+        # sum(x[i] * y[i+1]) - sum(y[i] * x[i+1]), con los vectores rotados
+        xs = [v[0] for v in vertices]
+        ys = [v[1] for v in vertices]
+        area = (sum(map(operator.mul, xs, ys[1:] + ys[:1])) -
+                sum(map(operator.mul, ys, xs[1:] + xs[:1])))
         
         return abs(area) / 2.0
     
@@ -51,7 +84,7 @@ class GeometryUtils:
         Returns:
             Perímetro en metros
         """
-        return sum(line.get('length', 0) for line in lines)
+        return sum(map(_line_length, lines))
     
     @staticmethod
     def detect_closed_polygon(lines: List[Dict], tolerance: float = 0.5) -> bool:
@@ -76,73 +109,65 @@ class GeometryUtils:
         # Verificar si el primer y último vértice son el mismo (o muy cercanos)
         first = vertices[0]
         last = vertices[-1]
-        distance = math.sqrt((first[0] - last[0])**2 + (first[1] - last[1])**2)
+        distance_sq = (first[0] - last[0])**2 + (first[1] - last[1])**2
         
-        return distance <= tolerance
+        return distance_sq <= tolerance * tolerance
     
     @staticmethod
-    def detect_parallel_lines(lines: List[Dict], angle_tolerance: float = 5.0) -> List[Tuple[int, int]]:
+    def detect_parallel_lines(lines: List[Dict], angle_tolerance: float = 5.0,
+                              angles: Optional[List[float]] = None) -> List[Tuple[int, int]]:
         """
         Detecta pares de líneas paralelas.
         
         Args:
             lines: Lista de líneas
             angle_tolerance: Tolerancia en grados para considerar líneas paralelas
+            angles: Ángulos de las líneas ya calculados con _get_line_angles (opcional)
         
         Returns:
             Lista de tuplas (índice1, índice2) de líneas paralelas
         """
-        parallel_pairs = []
-        n = len(lines)
+        # Calcular cada ángulo una sola vez, normalizado a [0, 180)
+        if angles is None:
+            angles = GeometryUtils._get_line_angles(lines)
+        angles = [angle % 180 for angle in angles]
         
-        for i in range(n):
-            for j in range(i + 1, n):
-                angle1 = GeometryUtils._get_line_angle(lines[i])
-                angle2 = GeometryUtils._get_line_angle(lines[j])
-                
-                # Normalizar ángulos a [0, 180)
-                angle1 = angle1 % 180
-                angle2 = angle2 % 180
-                
-                angle_diff = abs(angle1 - angle2)
-                
-                # Considerar tanto 0° como 180° (líneas en direcciones opuestas pero paralelas)
-                if angle_diff <= angle_tolerance or angle_diff >= (180 - angle_tolerance):
-                    parallel_pairs.append((i, j))
+        def is_parallel(i: int, j: int) -> bool:
+            angle_diff = abs(angles[i] - angles[j])
+            # Considerar tanto 0° como 180° (líneas en direcciones opuestas pero paralelas)
+            return min(angle_diff, 180 - angle_diff) <= angle_tolerance
         
-        return parallel_pairs
+        return GeometryUtils._match_angle_pairs(angles, 0.0, angle_tolerance, is_parallel)
     
     @staticmethod
-    def detect_perpendicular_lines(lines: List[Dict], angle_tolerance: float = 5.0) -> List[Tuple[int, int]]:
+    def detect_perpendicular_lines(lines: List[Dict], angle_tolerance: float = 5.0,
+                                   angles: Optional[List[float]] = None) -> List[Tuple[int, int]]:
         """
         Detecta pares de líneas perpendiculares (ángulo de 90°).
         
         Args:
             lines: Lista de líneas
             angle_tolerance: Tolerancia en grados
+            angles: Ángulos de las líneas ya calculados con _get_line_angles (opcional)
         
         Returns:
             Lista de tuplas (índice1, índice2) de líneas perpendiculares
         """
-        perpendicular_pairs = []
-        n = len(lines)
+        # Calcular cada ángulo una sola vez en lugar de por cada par
+        raw_angles = angles if angles is not None else GeometryUtils._get_line_angles(lines)
         
-        for i in range(n):
-            for j in range(i + 1, n):
-                angle1 = GeometryUtils._get_line_angle(lines[i])
-                angle2 = GeometryUtils._get_line_angle(lines[j])
-                
-                angle_diff = abs(angle1 - angle2) % 180
-                
-                # Verificar si están cerca de 90°
-                if abs(angle_diff - 90) <= angle_tolerance:
-                    perpendicular_pairs.append((i, j))
+        def is_perpendicular(i: int, j: int) -> bool:
+            angle_diff = abs(raw_angles[i] - raw_angles[j]) % 180
+            # Verificar si están cerca de 90°
+            return abs(angle_diff - 90) <= angle_tolerance
         
-        return perpendicular_pairs
+        # Una línea es perpendicular a otra si su ángulo coincide con el de la otra + 90°
+        angles = [angle % 180 for angle in raw_angles]
+        return GeometryUtils._match_angle_pairs(angles, 90.0, angle_tolerance, is_perpendicular)
     
     @staticmethod
     def detect_irregular_angles(lines: List[Dict], expected_angles: List[float] = [0, 45, 90, 135, 180], 
-                               tolerance: float = 5.0) -> List[Dict]:
+                               tolerance: float = 5.0, angles: Optional[List[float]] = None) -> List[Dict]:
         """
         Detecta líneas con ángulos irregulares que no se ajustan a los esperados.
         
@@ -150,18 +175,30 @@ class GeometryUtils:
             lines: Lista de líneas
             expected_angles: Ángulos esperados en grados
             tolerance: Tolerancia en grados
+            angles: Ángulos de las líneas ya calculados con _get_line_angles (opcional)
         
         Returns:
             Lista de diccionarios con información de líneas irregulares
         """
         irregular = []
         
-        for i, line in enumerate(lines):
-            angle = GeometryUtils._get_line_angle(line) % 180
+        # Cada ángulo esperado se compara también desplazado 180°; con los objetivos
+        # ordenados basta mirar los dos vecinos del punto de inserción
+        targets = sorted(list(expected_angles) + [exp + 180 for exp in expected_angles])
+        last = len(targets) - 1
+        
+        if angles is None:
+            angles = GeometryUtils._get_line_angles(lines)
+        
+        for i, raw_angle in enumerate(angles):
+            angle = raw_angle % 180
             
             # Verificar si el ángulo está cerca de alguno esperado
-            is_regular = any(abs(angle - exp) <= tolerance or abs(angle - (exp + 180)) <= tolerance 
-                           for exp in expected_angles)
+            pos = bisect.bisect_left(targets, angle)
+            is_regular = bool(targets) and (
+                (pos <= last and abs(angle - targets[pos]) <= tolerance) or
+                (pos > 0 and abs(angle - targets[pos - 1]) <= tolerance)
+            )
             
             if not is_regular:
                 irregular.append({
@@ -173,12 +210,13 @@ class GeometryUtils:
         return irregular
     
     @staticmethod
-    def calculate_shape_regularity(lines: List[Dict]) -> float:
+    def calculate_shape_regularity(lines: List[Dict], angles: Optional[List[float]] = None) -> float:
         """
         Calcula un índice de regularidad del polígono (0-1, donde 1 es muy regular).
         
         Args:
             lines: Lista de líneas
+            angles: Ángulos de las líneas ya calculados con _get_line_angles (opcional)
         
         Returns:
             Índice de regularidad entre 0 y 1
@@ -186,10 +224,25 @@ class GeometryUtils:
         if len(lines) < 3:
             return 0.0
         
-        # Calcular desviación estándar de longitudes
-        lengths = [line.get('length', 0) for line in lines]
-        mean_length = sum(lengths) / len(lengths)
-        variance = sum((l - mean_length) ** 2 for l in lengths) / len(lengths)
+        if angles is None:
+            angles = GeometryUtils._get_line_angles(lines)
+        
+        # Una sola pasada acumula suma y suma de cuadrados de las longitudes
+        # y la desviación cuadrática de los ángulos respecto a 90°
+        n = len(lines)
+        sum_length = 0.0
+        sum_length_sq = 0.0
+        sum_angle_dev_sq = 0.0
+        for line, angle in zip(lines, angles):
+            length = line.get('length', 0)
+            sum_length += length
+            sum_length_sq += length * length
+            angle_dev = angle % 180 - 90
+            sum_angle_dev_sq += angle_dev * angle_dev
+        
+        # Calcular desviación estándar de longitudes (Var = E[x²] - E[x]²)
+        mean_length = sum_length / n
+        variance = max(sum_length_sq / n - mean_length * mean_length, 0.0)
         std_dev = math.sqrt(variance)
         
         # Normalizar (invertir para que mayor regularidad = valor más alto)
@@ -199,21 +252,22 @@ class GeometryUtils:
             length_regularity = 0
         
         # Calcular regularidad de ángulos
-        angles = [GeometryUtils._get_line_angle(line) % 180 for line in lines]
-        angle_variance = sum((a - 90) ** 2 for a in angles) / len(angles)
+        angle_variance = sum_angle_dev_sq / n
         angle_regularity = 1 - min(angle_variance / 8100, 1)  # 90^2 = 8100
         
         # Promedio ponderado
         return (length_regularity * 0.6 + angle_regularity * 0.4)
     
     @staticmethod
-    def suggest_corrections(lines: List[Dict], scale: float = 50) -> List[Dict]:
+    def suggest_corrections(lines: List[Dict], scale: float = 50,
+                            angles: Optional[List[float]] = None) -> List[Dict]:
         """
         Sugiere correcciones para líneas irregulares.
         
         Args:
             lines: Lista de líneas
             scale: Escala de píxeles a metros
+            angles: Ángulos de las líneas ya calculados con _get_line_angles (opcional)
         
         Returns:
             Lista de sugerencias de corrección
@@ -221,7 +275,7 @@ class GeometryUtils:
         suggestions = []
         
         # Detectar ángulos irregulares
-        irregular_angles = GeometryUtils.detect_irregular_angles(lines)
+        irregular_angles = GeometryUtils.detect_irregular_angles(lines, angles=angles)
         
         for item in irregular_angles:
             idx = item['index']
@@ -237,7 +291,7 @@ class GeometryUtils:
             })
         
         # Detectar longitudes inconsistentes
-        lengths = [line.get('length', 0) for line in lines]
+        lengths = list(map(_line_length, lines))
         if lengths:
             mean_length = sum(lengths) / len(lengths)
             
@@ -265,7 +319,7 @@ class GeometryUtils:
         
         # Empezar con la primera línea
         ordered = [lines[0]]
-        remaining = lines[1:].copy()
+        remaining = lines[1:]  # el slice ya es una copia
         
         while remaining:
             last_line = ordered[-1]
@@ -324,34 +378,59 @@ class GeometryUtils:
         return ordered
     
     @staticmethod
-    def _extract_vertices(lines: List[Dict]) -> List[Tuple[float, float]]:
+    def _match_angle_pairs(angles: List[float], offset: float, tolerance: float,
+                           is_match: Callable[[int, int], bool]) -> List[Tuple[int, int]]:
+        """
+        Encuentra los pares (i, j), i < j, cuyo ángulo i está a menos de `tolerance`
+        grados del ángulo j + `offset` (módulo 180).
+        
+        Reparte los ángulos desplazados en cubetas circulares de ancho >= tolerance;
+        cada línea solo se compara con su cubeta y las dos adyacentes (incluida la
+        vuelta en 0°/180°). `is_match` confirma cada candidato con el criterio exacto
+        del llamador, de modo que el resultado es idéntico al del doble bucle.
+        """
+        # Margen mínimo para no perder candidatos por redondeo en los límites
+        window = tolerance + 1e-9
+        num_bins = max(int(180 // window), 1)
+        bin_width = 180 / num_bins
+        
+        buckets = defaultdict(list)
+        for j, angle in enumerate(angles):
+            buckets[int(((angle + offset) % 180) // bin_width) % num_bins].append(j)
+        
+        pairs = set()
+        for i, angle in enumerate(angles):
+            b = int(angle // bin_width) % num_bins
+            for neighbor in {(b - 1) % num_bins, b, (b + 1) % num_bins}:
+                for j in buckets.get(neighbor, ()):
+                    if i != j and is_match(i, j):
+                        pairs.add((i, j) if i < j else (j, i))
+        
+        return sorted(pairs)
+    
+    @staticmethod
+    def _extract_vertices(lines: List[Dict], tolerance: float = 15.0) -> List[Tuple[float, float]]:
         """Extrae vértices únicos de las líneas en orden."""
         if not lines:
             return []
         
         # Primero ordenar las líneas secuencialmente
-        ordered_lines = GeometryUtils._order_lines_sequential(lines)
+        ordered_lines = GeometryUtils._order_lines_sequential(lines, tolerance)
         
-        # Ahora extraer vértices en orden
+        # Ahora extraer vértices en orden: el inicio de la primera línea y el
+        # punto final de cada línea (el inicio debería estar cerca del vértice anterior)
         vertices = [ordered_lines[0]['start']]
-        
-        for line in ordered_lines:
-            # Añadir el punto final de cada línea
-            # (el inicio debería estar cerca del vértice anterior)
-            vertices.append(line['end'])
+        vertices.extend([line['end'] for line in ordered_lines])
         
         return vertices
     
     @staticmethod
-    def _get_line_angle(line: Dict) -> float:
-        """Calcula el ángulo de una línea en grados."""
-        start = line['start']
-        end = line['end']
-        
-        dx = end[0] - start[0]
-        dy = end[1] - start[1]
-        
-        return math.degrees(math.atan2(dy, dx))
+    def _get_line_angles(lines: List[Dict]) -> List[float]:
+        """Calcula los ángulos (en grados) de todas las líneas en una sola pasada."""
+        soa = _to_soa(lines)
+        dy = map(operator.sub, soa.ey, soa.sy)
+        dx = map(operator.sub, soa.ex, soa.sx)
+        return list(map(math.degrees, map(math.atan2, dy, dx)))
     
     @staticmethod
     def format_area(area: float) -> str:
@@ -363,6 +442,29 @@ class GeometryUtils:
         """Formatea la longitud con la unidad apropiada."""
         return f"{length:.2f} m"
     
+    @staticmethod
+    def lines_to_meters(lines: List[Dict], scale: float) -> List[Dict]:
+        """
+        Convierte las coordenadas de las líneas de píxeles a metros.
+        
+        Args:
+            lines: Lista de líneas con coordenadas en píxeles
+            scale: Escala de píxeles a metros (ej: 50 = 50 píxeles = 1 metro)
+        
+        Returns:
+            Nueva lista de líneas con coordenadas en metros
+        """
+        # Multiplicar por el recíproco evita dos divisiones por punto
+        inv_scale = 1.0 / scale
+        return [
+            {
+                'start': (line['start'][0] * inv_scale, line['start'][1] * inv_scale),
+                'end': (line['end'][0] * inv_scale, line['end'][1] * inv_scale),
+                'length': line.get('length', 0)
+            }
+            for line in lines
+        ]
+    
     @staticmethod
     def calculate_zone_area(zone_lines: List[Dict], scale: float = 50) -> float:
         """
@@ -378,18 +480,11 @@ class GeometryUtils:
         if not zone_lines or len(zone_lines) < 3:
             return 0.0
         
-        # Convertir coordenadas de píxeles a metros
-        # División: píxeles / (píxeles/metro) = metros
-        lines_in_meters = []
-        for line in zone_lines:
-            lines_in_meters.append({
-                'start': (line['start'][0] / scale, line['start'][1] / scale),
-                'end': (line['end'][0] / scale, line['end'][1] / scale),
-                'length': line.get('length', 0)
-            })
-        
-        # calculate_polygon_area usa Shoelace formula que ya devuelve área correcta
-        return GeometryUtils.calculate_polygon_area(lines_in_meters)
+        # El área escala con 1/scale², así que se calcula directamente en píxeles
+        # sin reconstruir la lista de líneas en metros. La tolerancia de unión
+        # (15 en metros) se expresa en píxeles para ordenar igual que antes.
+        area_px = GeometryUtils._polygon_area(zone_lines, 15.0 * scale)
+        return area_px / (scale * scale)
     
     @staticmethod
     def get_zone_centroid(zone_lines: List[Dict]) -> Tuple[float, float]:
@@ -405,15 +500,17 @@ class GeometryUtils:
         if not zone_lines:
             return (0, 0)
         
-        vertices = GeometryUtils._extract_vertices(zone_lines)
+        ordered_lines = GeometryUtils._order_lines_sequential(zone_lines)
         
-        if not vertices:
-            return (0, 0)
-        
-        # Calcular centroide simple (promedio de vértices)
-        x_sum = sum(v[0] for v in vertices)
-        y_sum = sum(v[1] for v in vertices)
-        n = len(vertices)
+        # Calcular centroide simple (promedio de vértices) acumulando sobre la
+        # marcha los mismos vértices que _extract_vertices, sin construir la lista:
+        # el inicio de la primera línea y el final de cada línea
+        x_sum, y_sum = ordered_lines[0]['start']
+        for line in ordered_lines:
+            x, y = line['end']
+            x_sum += x
+            y_sum += y
+        n = len(ordered_lines) + 1
         
         return (x_sum / n, y_sum / n)
     
@@ -440,54 +537,80 @@ class GeometryUtils:
         # Verificar si el primer y último vértice están cerca
         first = vertices[0]
         last = vertices[-1]
-        distance = math.sqrt((first[0] - last[0])**2 + (first[1] - last[1])**2)
+        distance_sq = (first[0] - last[0])**2 + (first[1] - last[1])**2
         
-        return distance <= tolerance
+        return distance_sq <= tolerance * tolerance
     
     @staticmethod
-    def find_connected_lines(all_lines: List[Dict], start_line_index: int, 
-                            tolerance: float = 10.0) -> List[int]:
+    def find_all_components(all_lines: List[Dict], tolerance: float = 10.0
+                            ) -> List[Tuple[List[int], List[Dict]]]:
         """
-        Encuentra todas las líneas conectadas a partir de una línea inicial.
+        Agrupa todas las líneas del plano en componentes conectadas.
         Útil para auto-detectar zonas.
         
+        Un índice espacial de extremos propone candidatas y una estructura
+        Union-Find une las líneas que comparten algún punto; los índices y las
+        líneas de cada componente se agrupan en la misma pasada.
+        
         Args:
             all_lines: Lista completa de líneas del plano
-            start_line_index: Índice de la línea inicial
             tolerance: Distancia máxima para considerar puntos conectados
         
         Returns:
-            Lista de índices de líneas conectadas
+            Lista de tuplas (índices ordenados, líneas) por componente, en orden
+            de su primer índice
         """
-        if start_line_index >= len(all_lines):
-            return []
-        
-        connected = {start_line_index}
-        to_check = [start_line_index]
-        
-        while to_check:
-            current_idx = to_check.pop()
-            current_line = all_lines[current_idx]
+        parent = list(range(len(all_lines)))
+        
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        # Celdas de lado `tolerance`: dos puntos a distancia <= tolerance caen en
+        # la misma celda o en una vecina
+        cell_size = tolerance if tolerance > 0 else 1.0
+        tol2 = tolerance * tolerance
+        grid = {}
+        
+        for i, line in enumerate(all_lines):
+            endpoints = (line['start'], line['end'])
+            cells = [(int(p[0] // cell_size), int(p[1] // cell_size)) for p in endpoints]
             
-            # Buscar líneas conectadas
-            for i, line in enumerate(all_lines):
-                if i in connected:
-                    continue
-                
-                # Verificar si comparten algún punto
-                if (GeometryUtils._points_near(current_line['start'], line['start'], tolerance) or
-                    GeometryUtils._points_near(current_line['start'], line['end'], tolerance) or
-                    GeometryUtils._points_near(current_line['end'], line['start'], tolerance) or
-                    GeometryUtils._points_near(current_line['end'], line['end'], tolerance)):
-                    
-                    connected.add(i)
-                    to_check.append(i)
-        
-        return list(connected)
+            # Comparar solo con líneas ya indexadas en las 9 celdas vecinas
+            candidates = set()
+            for cx, cy in cells:
+                for gx in (cx - 1, cx, cx + 1):
+                    for gy in (cy - 1, cy, cy + 1):
+                        candidates.update(grid.get((gx, gy), ()))
+            
+            for j in candidates:
+                other = all_lines[j]
+                if any((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 <= tol2
+                       for p in endpoints for q in (other['start'], other['end'])):
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[root_i] = root_j
+            
+            for key in cells:
+                grid.setdefault(key, []).append(i)
+        
+        components = {}
+        for i, line in enumerate(all_lines):
+            root = find(i)
+            group = components.get(root)
+            if group is None:
+                components[root] = ([i], [line])
+            else:
+                group[0].append(i)
+                group[1].append(line)
+        
+        return list(components.values())
     
     @staticmethod
     def _points_near(p1: Tuple[float, float], p2: Tuple[float, float], 
                      tolerance: float) -> bool:
         """Verifica si dos puntos están cerca según la tolerancia."""
-        distance = math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
-        return distance <= tolerance
+        # Comparar distancias al cuadrado evita la raíz cuadrada
+        return (p1[0] - p2[0])**2 + (p1[1] - p2[1])**2 <= tolerance * tolerance
@@ -3,11 +3,151 @@ from tkinter.simpledialog import askfloat, askstring
 from tkinter import scrolledtext, messagebox, ttk
 import math
 import json
+import logging
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from tkinter import filedialog
-from claude_analyzer import ClaudeAnalyzer, load_env_file
 from zone_manager import ZoneManager
 
+log = logging.getLogger(__name__)
+
+# Direcciones (cos, sin) precalculadas para el modo de movimiento fijo,
+# en múltiplos de 10° entre -180° y 180°
+SNAP_ANGLE_STEP = 10
+_SNAP_DIRECTIONS = {
+    k: (math.cos(math.radians(k * SNAP_ANGLE_STEP)), math.sin(math.radians(k * SNAP_ANGLE_STEP)))
+    for k in range(-180 // SNAP_ANGLE_STEP, 180 // SNAP_ANGLE_STEP + 1)
+}
+
+# Coseno y seno de 150°, para las bases de las flechas de cota
+_COS_150 = -math.sqrt(3) / 2
+_SIN_150 = 0.5
+
+# Estilo de las acotaciones y de la rosa de los vientos, compartido por todos
+# sus elementos en lugar de volver a crear las mismas tuplas y cadenas en cada uno
+_DIM_TAGS = ("dimension",)
+_DIM_LINE_COLOR = "#333"
+_DIM_EXT_COLOR = "#666"
+_DIM_TEXT_COLOR = "#000"
+_DIM_TEXT_BG = "white"
+_COMPASS_TAGS = ("compass",)
+_COMPASS_FONT = ("Arial", 10)
+_COMPASS_NORTH_FONT = ("Arial", 12, "bold")
+
+# Plantillas de los elementos repetidos del SVG, rellenadas con % en una sola operación
+_SVG_POLYGON_FMT = (
+    '  <polygon points="%s" fill="%s" fill-opacity="0.3" stroke="%s" stroke-width="2" />\n'
+)
+_SVG_ZONE_TEXT_FMT = (
+    '  <text x="%s" y="%s" font-family="Arial" font-size="11" font-weight="bold" '
+    'fill="#333" text-anchor="middle">%s</text>\n'
+)
+_SVG_LINE_FMT = '  <line x1="%s" y1="%s" x2="%s" y2="%s" style="stroke:black;stroke-width:2" />\n'
+_SVG_DIM_TEXT_FMT = '  <text x="%s" y="%s" font-family="Arial" font-size="12" fill="black">%s</text>\n'
+_SVG_LABEL_FMT = (
+    '  <text x="%s" y="%s" font-family="Arial" font-size="14" font-weight="bold" '
+    'fill="#333" text-anchor="middle" alignment-baseline="middle" '
+    'transform="rotate(%s, %s, %s)">%s</text>\n'
+)
+
+# Rosa de los vientos completa (fondo, cuatro puntos cardinales y sus letras)
+_SVG_COMPASS_FMT = (
+    '  <circle cx="%(cx)s" cy="%(cy)s" r="%(r)s" fill="white" stroke="#333" stroke-width="2" />\n'
+    '  <line x1="%(cx)s" y1="%(cy)s" x2="%(cx)s" y2="%(n_y)s" '
+    'stroke="red" stroke-width="3" marker-end="url(#arrowRed)" />\n'
+    '  <text x="%(cx)s" y="%(n_text_y)s" font-family="Arial" font-size="12" font-weight="bold" '
+    'fill="red" text-anchor="middle">N</text>\n'
+    '  <line x1="%(cx)s" y1="%(cy)s" x2="%(cx)s" y2="%(s_y)s" stroke="#666" stroke-width="2" />\n'
+    '  <text x="%(cx)s" y="%(s_text_y)s" font-family="Arial" font-size="10" fill="#666" '
+    'text-anchor="middle">S</text>\n'
+    '  <line x1="%(cx)s" y1="%(cy)s" x2="%(e_x)s" y2="%(cy)s" stroke="#666" stroke-width="2" />\n'
+    '  <text x="%(e_text_x)s" y="%(cy)s" font-family="Arial" font-size="10" fill="#666" '
+    'alignment-baseline="middle">E</text>\n'
+    '  <line x1="%(cx)s" y1="%(cy)s" x2="%(o_x)s" y2="%(cy)s" stroke="#666" stroke-width="2" />\n'
+    '  <text x="%(o_text_x)s" y="%(cy)s" font-family="Arial" font-size="10" fill="#666" '
+    'text-anchor="end" alignment-baseline="middle">O</text>\n'
+)
+_SVG_ROTATION_FMT = (
+    '  <text x="%s" y="%s" font-family="Arial" font-size="9" fill="#666" '
+    'text-anchor="middle">Rotación: %s°</text>\n'
+)
+
+
+@lru_cache(maxsize=None)
+def _dimension_font(zoom_level):
+    """Fuente del texto de las cotas para un nivel de zoom (una tupla por nivel)."""
+    return ("Arial", max(8, int(10 * zoom_level)))
+
+
+def _rotate_points(points, angle_deg, center_x, center_y):
+    """
+    Rota en bloque una lista de puntos (x, y) alrededor de (center_x, center_y).
+    
+    El seno y coseno se calculan una sola vez y todos los puntos se transforman
+    en una única pasada; devuelve una lista nueva en el mismo orden.
+    """
+    angle_rad = math.radians(angle_deg)
+    cos_angle = math.cos(angle_rad)
+    sin_angle = math.sin(angle_rad)
+    # Rotar respecto al centro equivale a la transformación afín p' = R·p + t,
+    # con la traslación t calculada una vez: dos productos y una suma por coordenada
+    offset_x = center_x - cos_angle * center_x + sin_angle * center_y
+    offset_y = center_y - sin_angle * center_x - cos_angle * center_y
+    return [
+        (cos_angle * x - sin_angle * y + offset_x,
+         sin_angle * x + cos_angle * y + offset_y)
+        for x, y in points
+    ]
+
+
+def _segment_terms(lines):
+    """
+    Términos fijos de cada línea para medir distancias punto-segmento:
+    (x1, y1, x2, y2, dx, dy, 1 / longitud², 0 si la línea es un punto).
+    """
+    terms = []
+    for line in lines:
+        x1, y1 = line["start"]
+        x2, y2 = line["end"]
+        dx = x2 - x1
+        dy = y2 - y1
+        length_sq = dx * dx + dy * dy
+        terms.append((x1, y1, x2, y2, dx, dy, 1.0 / length_sq if length_sq else 0.0))
+    return terms
+
+
+def _nearest_segment(px, py, segments, tolerance, indices=None):
+    """
+    Índice del segmento más cercano a (px, py) a no más de `tolerance`, o -1 si
+    ninguno está tan cerca (en empate, el primero). `segments` son los términos de
+    _segment_terms; con `indices` (en orden creciente) solo se revisan esos.
+    
+    Compara distancias al cuadrado, sin raíz, y descarta sin más cálculo las
+    líneas cuyo rectángulo envolvente, ampliado en `tolerance`, no contiene el punto.
+    """
+    best_index = -1
+    best_d2 = tolerance * tolerance
+    for index in range(len(segments)) if indices is None else indices:
+        x1, y1, x2, y2, dx, dy, inv_length_sq = segments[index]
+        if ((px < x1 - tolerance and px < x2 - tolerance) or (px > x1 + tolerance and px > x2 + tolerance) or
+                (py < y1 - tolerance and py < y2 - tolerance) or (py > y1 + tolerance and py > y2 + tolerance)):
+            continue
+        
+        # Punto más cercano del segmento: proyección acotada a [0, 1]
+        t = ((px - x1) * dx + (py - y1) * dy) * inv_length_sq
+        t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+        ex = px - (x1 + t * dx)
+        ey = py - (y1 + t * dy)
+        d2 = ex * ex + ey * ey
+        if d2 < best_d2 or (best_index < 0 and d2 == best_d2):
+            best_index = index
+            best_d2 = d2
+    return best_index
+
+
 class DrawingApp:
     def __init__(self, root):
         self.root = root
@@ -20,8 +160,23 @@ class DrawingApp:
         self.dragging = False
         self.fixed_movement_mode = False  # Modo para mover extremo en ángulos específicos
         self.SCALE = 50  # 1 metro = 50 píxeles
+        self._INV_SCALE = 1.0 / self.SCALE  # Metros por píxel
         self.ANCHOR_THRESHOLD = 10  # Distancia mínima para considerar un punto como anclaje
         self.UNIFY_THRESHOLD = 15  # Distancia mínima para unificar puntos
+        self.point_index = {}  # Índice espacial de los extremos de todas las líneas
+        self._lines_revision = 0  # Se incrementa cada vez que cambia la geometría de las líneas
+        self._point_index_revision = -1  # Revisión de las líneas con la que se construyó point_index
+        self.SEGMENT_CELL = 100  # Lado (px del mundo) de las celdas del índice de segmentos
+        self.segment_index = {}  # Celda -> índices de las líneas cuyo rectángulo la toca
+        self.segment_terms = []  # Términos de distancia de cada línea (ver _segment_terms)
+        self._segment_index_revision = -1  # Revisión de las líneas con la que se construyó segment_index
+        self._bbox = None  # Bounding box de todas las líneas (ver _drawing_bbox)
+        self._bbox_revision = -1  # Revisión de las líneas con la que se calculó _bbox
+        self._drag_line_index = None  # Línea cuyo extremo se está arrastrando
+        self._drag_origin = None  # Extremos de esa línea al empezar el arrastre
+        self.MOTION_FRAME_MS = 16  # Intervalo mínimo entre actualizaciones del arrastre (~60 fps)
+        self._pending_pos = None  # Última posición del ratón pendiente de procesar
+        self._motion_after_id = None  # Tick programado para procesar el movimiento
         self.current_y_offset = 0  # Variable para mantener el desplazamiento vertical de las líneas
         self.adding_label_mode = False  # Modo para agregar etiquetas adicionales
         self.text_labels = []  # Lista de etiquetas de texto personalizadas
@@ -35,6 +190,15 @@ class DrawingApp:
         self.EXTENSION_GAP = 5  # Espacio entre línea y línea de extensión
         self.EXTENSION_OVERSHOOT = 8  # Cuánto sobresalen las líneas de extensión
         self.ARROW_SIZE = 8  # Tamaño de las flechas
+        self.VIEWPORT_MARGIN = 60  # Margen (px a zoom 1) alrededor de la vista para no recortar cotas
+        self.MIN_LABEL_PX = 40  # Longitud mínima en pantalla (px) para dibujar la cota de una línea...
+        self.LABEL_LOD_LINES = 200  # ...cuando el plano tiene más líneas que esto
+        self.show_labels = True  # Casilla "Mostrar cotas" de la barra de herramientas
+        self._configure_pending = False  # Redibujado pendiente por cambio de tamaño del canvas
+        # Tamaño del canvas, actualizado en <Configure> para no consultar a Tk en cada evento
+        # (1 x 1 es lo que reporta Tk mientras el canvas aún no se ha mostrado)
+        self._cw = 1
+        self._ch = 1
         
         # Variables para gestión de zonas
         self.zone_manager = ZoneManager(scale=self.SCALE)
@@ -45,7 +209,11 @@ class DrawingApp:
         # Variables para orientación y rotación
         self.rotation_angle = 0  # Ángulo de rotación del plano en grados
         self.compass_size = 60  # Tamaño de la rosa de los vientos
+        self._compass_pos = None  # Centro de la rosa ya dibujada (None si no existe)
         self._last_slider_value = 0  # Rastrear posición previa del slider
+        self._pending_slider_value = 0  # Última posición del slider pendiente de aplicar
+        self._slider_after_id = None  # Rotación programada con after_idle
+        self._slider_origin = None  # Coordenadas al empezar a arrastrar el slider
         
         # Variables para zoom y pan
         self.zoom_level = 1.0  # Nivel de zoom (1.0 = 100%)
@@ -76,9 +244,13 @@ class DrawingApp:
         self.measure_perimeter = 0.0  # Perímetro calculado
         self.measure_total_length = 0.0  # Longitud total de líneas
         
-        # Inicializar Claude Analyzer (con manejo de errores)
+        # Claude Analyzer: se inicializa al pedir el primer análisis, no al arrancar
         self.claude_analyzer = None
-        self._initialize_claude()
+        self._claude_initialized = False  # Ya se intentó inicializar (con o sin éxito)
+        self._ai_executor = None  # Hilo de fondo para las llamadas a Claude (se crea al usarse)
+        self._progress_window = None  # Ventana de progreso del análisis, reutilizada
+        self.AI_CACHE_SIZE = 32  # Máximo de análisis de IA recordados por plano
+        self._ai_cache = OrderedDict()  # Resultados de análisis de IA por huella del plano (LRU)
 
         # Configurar la UI primero
         self.setup_ui()
@@ -89,6 +261,8 @@ class DrawingApp:
         self.canvas.bind("<ButtonRelease-1>", self.release_point)
         self.canvas.bind("<Button-3>", self.on_label_right_click)
         self.canvas.bind("<Double-Button-1>", self.on_text_label_double_click)
+        # Redibujar al cambiar el tamaño (líneas que entran en la vista y rosa de los vientos)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
         
         # Bindings para zoom con rueda del mouse
         self.canvas.bind("<Control-MouseWheel>", self.on_mouse_wheel_zoom)
@@ -196,6 +370,15 @@ class DrawingApp:
         )
         self.toggle_dimension_button.pack(pady=2)
         
+        # Casilla para mostrar/ocultar todas las cotas
+        self.show_labels_var = tk.BooleanVar(value=self.show_labels)
+        tk.Checkbutton(
+            toolbar,
+            text="Mostrar cotas",
+            variable=self.show_labels_var,
+            command=self.toggle_show_labels
+        ).pack(pady=2)
+        
         # Info sobre ocultar cotas
         info_dimension = tk.Label(
             toolbar,
@@ -598,10 +781,10 @@ class DrawingApp:
         self.fixed_movement_mode = not self.fixed_movement_mode
         if self.fixed_movement_mode:
             self.fixed_movement_button.config(bg="green", text="Movimiento Fijo Activado")
-            print("Modo de movimiento fijo activado.")
+            log.debug("Modo de movimiento fijo activado.")
         else:
             self.fixed_movement_button.config(bg="SystemButtonFace", text="Activar Movimiento Fijo")
-            print("Modo de movimiento fijo desactivado.")
+            log.debug("Modo de movimiento fijo desactivado.")
     
     def toggle_dimension_visibility(self):
         """Alterna la visibilidad de la cota de la línea seleccionada."""
@@ -614,10 +797,10 @@ class DrawingApp:
             # Actualizar texto del botón
             if line["dimension_visible"]:
                 self.toggle_dimension_button.config(text="👁️‍🗨️ Ocultar Cota")
-                print(f"Cota de línea {self.selected_line_for_dimension} mostrada")
+                log.debug("Cota de línea %s mostrada", self.selected_line_for_dimension)
             else:
                 self.toggle_dimension_button.config(text="👁️ Mostrar Cota")
-                print(f"Cota de línea {self.selected_line_for_dimension} ocultada")
+                log.debug("Cota de línea %s ocultada", self.selected_line_for_dimension)
             
             # Redibujar canvas
             self.redraw_canvas()
@@ -642,22 +825,37 @@ class DrawingApp:
 
             # Crear la línea en el canvas
             line = self.canvas.create_line(self.start_point, end_point, fill="black", width=2)
-            self.lines.append({
-                "start": self.start_point,
-                "end": end_point,
-                "line": line,
-                "length": length,
-                "dimension_visible": True  # Cota visible por defecto
-            })
+            self.lines.append(self._new_line_record(self.start_point, end_point, length, line))
+            self._lines_revision += 1
             # Pasar el índice de la línea recién agregada
             self.create_label(self.start_point, end_point, length, len(self.lines) - 1)
-            self.draw_anchor_points(self.start_point, end_point)
+            self.lines[-1]["anchors"] = self.draw_anchor_points(self.start_point, end_point)
 
             # Ajustar la posición en Y para que la nueva línea se dibuje más abajo
             self.current_y_offset += 30  # Desplazamos las líneas 30 píxeles hacia abajo cada vez
             self.start_point = (50, self.current_y_offset + 50)
             self.mark_unsaved_changes()
 
+    @staticmethod
+    def _new_line_record(start, end, length, line_id=None, dimension_visible=True):
+        """
+        Crea el registro de una línea con todas sus claves desde el inicio.
+        
+        Los registros siguen siendo diccionarios porque GeometryUtils, ZoneManager,
+        ClaudeAnalyzer y el guardado en JSON los consumen así; tener siempre las
+        mismas claves en el mismo orden evita que crezcan y se redimensionen al
+        asignar después los IDs del canvas.
+        """
+        return {
+            "start": start,
+            "end": end,
+            "line": line_id,
+            "length": length,
+            "dimension_visible": dimension_visible,  # Cota visible por defecto
+            "anchors": None,
+            "label": None
+        }
+
     def on_canvas_click(self, event):
         # Prioridad 1: Modo de selección de zonas
         if self.zone_selection_mode:
@@ -686,18 +884,24 @@ class DrawingApp:
         else:
             # PRIORIDAD 1: Verificar primero si el clic está sobre un punto de anclaje (puntos rojos)
             # Esto tiene mayor prioridad que seleccionar la línea completa
-            point_selected = False
-            for line in self.lines:
-                if self.is_within_point(world_x, world_y, *line["start"]):
-                    self.selected_point = ("start", line)
-                    self.dragging = True
-                    point_selected = True
-                    break
-                elif self.is_within_point(world_x, world_y, *line["end"]):
-                    self.selected_point = ("end", line)
-                    self.dragging = True
-                    point_selected = True
-                    break
+            # Solo se revisan los extremos de las celdas vecinas del índice (que se
+            # reconstruye únicamente si las líneas cambiaron), en orden de línea y
+            # con el inicio antes que el fin: el primero cercano gana
+            self._ensure_point_index()
+            threshold = self.ANCHOR_THRESHOLD
+            hit = next(
+                ((i, is_end) for i, is_end, x, y in self._nearby_endpoints(world_x, world_y)
+                 if abs(world_x - x) <= threshold and abs(world_y - y) <= threshold),
+                None
+            )
+            point_selected = hit is not None
+            if point_selected:
+                line_index, is_end = hit
+                line = self.lines[line_index]
+                self.selected_point = ("end" if is_end else "start", line)
+                self.dragging = True
+                self._drag_line_index = line_index
+                self._drag_origin = (line["start"], line["end"])
             
             # PRIORIDAD 2: Si no se seleccionó un punto de anclaje, verificar si el clic está cerca de una línea
             # (para seleccionar la línea y poder ocultar/mostrar su cota)
@@ -717,37 +921,48 @@ class DrawingApp:
                         break
 
     def is_within_point(self, click_x, click_y, point_x, point_y):
-        return (
-            click_x >= point_x - self.ANCHOR_THRESHOLD and
-            click_x <= point_x + self.ANCHOR_THRESHOLD and
-            click_y >= point_y - self.ANCHOR_THRESHOLD and
-            click_y <= point_y + self.ANCHOR_THRESHOLD
-        )
+        threshold = self.ANCHOR_THRESHOLD
+        return abs(click_x - point_x) <= threshold and abs(click_y - point_y) <= threshold
 
     def move_point(self, event):
         if self.dragging and self.selected_point is not None:
+            # Se guarda solo la última posición; el trabajo se hace una vez por cuadro
+            self._pending_pos = (event.x, event.y)
+            if self._motion_after_id is None:
+                self._motion_after_id = self.root.after(self.MOTION_FRAME_MS, self._flush_motion)
+
+    def _flush_motion(self):
+        """Aplica la última posición pendiente del arrastre de un punto."""
+        self._motion_after_id = None
+        pending = self._pending_pos
+        self._pending_pos = None
+        if pending is not None and self.dragging and self.selected_point is not None:
             point_type, line = self.selected_point
             # Transformar coordenadas del canvas a coordenadas del mundo
-            new_x, new_y = self._inverse_transform_point(event.x, event.y)
+            new_x, new_y = self._inverse_transform_point(*pending)
 
             if self.fixed_movement_mode:
                 # Calcular ángulos en múltiplos de 10 grados
                 start_x, start_y = line["start"] if point_type == "end" else line["end"]
-                angle_radians = math.atan2(new_y - start_y, new_x - start_x)
-                angle_degrees = math.degrees(angle_radians)
-                snap_angle = round(angle_degrees / 10) * 10
-                snap_radians = math.radians(snap_angle)
-                length = math.sqrt((new_x - start_x) ** 2 + (new_y - start_y) ** 2)
-                new_x = start_x + length * math.cos(snap_radians)
-                new_y = start_y + length * math.sin(snap_radians)
-
-            # Unificación de puntos de anclaje cercanos
-            for other_line in self.lines:
-                if line != other_line:
-                    if self.is_within_point(new_x, new_y, *other_line["start"]):
-                        new_x, new_y = other_line["start"]
-                    elif self.is_within_point(new_x, new_y, *other_line["end"]):
-                        new_x, new_y = other_line["end"]
+                new_x, new_y = self._snap_to_fixed_angle(new_x, new_y, start_x, start_y)
+
+            # Unificación de puntos de anclaje cercanos (solo extremos en celdas vecinas).
+            # Se recorren las líneas en orden probando inicio y luego final; tras cada
+            # ajuste se vuelve a consultar alrededor del nuevo punto desde la línea siguiente.
+            nearby_endpoints = self._nearby_endpoints
+            threshold = self.ANCHOR_THRESHOLD
+            drag_index = self._drag_line_index
+            next_line = 0
+            while True:
+                for i, _, point_x, point_y in nearby_endpoints(new_x, new_y):
+                    # Mismo criterio que is_within_point, sin la llamada por candidato
+                    if (i >= next_line and i != drag_index and abs(new_x - point_x) <= threshold
+                            and abs(new_y - point_y) <= threshold):
+                        new_x, new_y = point_x, point_y
+                        next_line = i + 1
+                        break
+                else:
+                    break
 
             if point_type == "end":
                 line["end"] = (new_x, new_y)
@@ -755,50 +970,268 @@ class DrawingApp:
                 line["start"] = (new_x, new_y)
 
             # Actualizar la longitud y la etiqueta
-            line["length"] = self.calculate_length(line["start"], line["end"])
-            self.update_label(line)
-            self.redraw_canvas()
+            start, end = line["start"], line["end"]
+            line["length"] = self.calculate_length(start, end)
+            
+            # point_index sigue valiendo: la línea arrastrada se excluye y se reindexa al soltar
+            index_in_sync = self._point_index_revision == self._lines_revision
+            self._lines_revision += 1
+            if index_in_sync:
+                self._point_index_revision = self._lines_revision
+            
+            # Durante el arrastre solo se actualizan los elementos de esta línea;
+            # el resto del dibujo se sincroniza al soltar el punto
+            self._redraw_one(line)
             self.mark_unsaved_changes()
 
+    def _snap_to_fixed_angle(self, x, y, origin_x, origin_y):
+        """Ajusta (x, y) a la dirección múltiplo de SNAP_ANGLE_STEP más cercana vista desde el origen."""
+        dx = x - origin_x
+        dy = y - origin_y
+        step = round(math.degrees(math.atan2(dy, dx)) / SNAP_ANGLE_STEP)
+        cos_a, sin_a = _SNAP_DIRECTIONS[step]
+        length = math.hypot(dx, dy)
+        return origin_x + length * cos_a, origin_y + length * sin_a
+    
     def release_point(self, event):
+        # Procesar el último movimiento antes de cancelar el tick pendiente
+        if self._motion_after_id is not None:
+            self.root.after_cancel(self._motion_after_id)
+            self._flush_motion()
+        was_dragging = self.dragging and self.selected_point is not None
+        
+        # Solo cambió la línea arrastrada: moverla dentro del índice en vez de reconstruirlo
+        if was_dragging:
+            line = self.selected_point[1]
+            self._reindex_line(self._drag_line_index, self._drag_origin, (line["start"], line["end"]))
+        
         self.dragging = False
         self.selected_point = None
+        self._drag_line_index = None
+        self._drag_origin = None
+        
+        # Sincronizar zonas, sombras y el resto de cotas con la geometría final
+        # (moviendo los elementos existentes, sin recrear el canvas)
+        if was_dragging:
+            self._reposition_canvas()
+    
+    def _ensure_point_index(self):
+        """
+        Agrupa los extremos de todas las líneas en celdas de lado ANCHOR_THRESHOLD,
+        para que la unificación de anclajes solo revise las celdas vecinas al punto
+        arrastrado. El índice se conserva entre arrastres y solo se reconstruye
+        cuando _lines_revision indica que la geometría cambió por otra vía.
+        
+        Cada celda guarda copias planas (índice, es_final, x, y) de los extremos,
+        así la búsqueda no vuelve a los diccionarios de self.lines.
+        """
+        if self._point_index_revision == self._lines_revision:
+            return
+        threshold = self.ANCHOR_THRESHOLD
+        self.point_index = {}
+        for i, other_line in enumerate(self.lines):
+            for is_end, (x, y) in enumerate((other_line["start"], other_line["end"])):
+                key = (int(x // threshold), int(y // threshold))
+                self.point_index.setdefault(key, []).append((i, is_end, x, y))
+        self._point_index_revision = self._lines_revision
+    
+    def _reindex_line(self, index, old_points, new_points):
+        """Mueve en point_index los extremos de una línea que fue arrastrada."""
+        if self._point_index_revision != self._lines_revision:
+            return  # El índice ya estaba desactualizado: se reconstruirá completo
+        threshold = self.ANCHOR_THRESHOLD
+        for is_end, ((old_x, old_y), (new_x, new_y)) in enumerate(zip(old_points, new_points)):
+            cell = self.point_index.get((int(old_x // threshold), int(old_y // threshold)))
+            if cell is not None and (index, is_end, old_x, old_y) in cell:
+                cell.remove((index, is_end, old_x, old_y))
+            key = (int(new_x // threshold), int(new_y // threshold))
+            self.point_index.setdefault(key, []).append((index, is_end, new_x, new_y))
+    
+    def _nearby_endpoints(self, x, y):
+        """Extremos (índice, es_final, x, y) en las 9 celdas alrededor de (x, y), en orden de línea."""
+        threshold = self.ANCHOR_THRESHOLD
+        cx = int(x // threshold)
+        cy = int(y // threshold)
+        found = []
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                found.extend(self.point_index.get((gx, gy), ()))
+        found.sort()
+        return found
+    
+    def _ensure_segment_index(self):
+        """
+        Reparte las líneas en celdas de lado SEGMENT_CELL según su rectángulo
+        envolvente, para que los clics de selección solo midan la distancia a las
+        líneas cercanas. Junto con él se guardan los términos de distancia de cada
+        línea. Se reconstruye solo cuando cambia _lines_revision.
+        """
+        if self._segment_index_revision == self._lines_revision:
+            return
+        cell = self.SEGMENT_CELL
+        self.segment_index = {}
+        self.segment_terms = _segment_terms(self.lines)
+        for i, (x1, y1, x2, y2, *_) in enumerate(self.segment_terms):
+            for gx in range(int(min(x1, x2) // cell), int(max(x1, x2) // cell) + 1):
+                for gy in range(int(min(y1, y2) // cell), int(max(y1, y2) // cell) + 1):
+                    self.segment_index.setdefault((gx, gy), []).append(i)
+        self._segment_index_revision = self._lines_revision
+    
+    def _nearby_segments(self, x, y, tolerance):
+        """
+        Índices (en orden) de las líneas que pueden estar a no más de `tolerance`
+        de (x, y): el punto más cercano de la línea cae en su rectángulo, así que
+        basta revisar las celdas que cubre el cuadrado de lado 2·tolerance.
+        """
+        self._ensure_segment_index()
+        cell = self.SEGMENT_CELL
+        found = set()
+        for gx in range(int((x - tolerance) // cell), int((x + tolerance) // cell) + 1):
+            for gy in range(int((y - tolerance) // cell), int((y + tolerance) // cell) + 1):
+                found.update(self.segment_index.get((gx, gy), ()))
+        return sorted(found)
+    
+    def _redraw_one(self, line):
+        """Actualiza en el canvas solo los elementos de una línea: trazo, anclajes y cota."""
+        if line.get("line") is None:
+            return  # Fuera de la vista: no tiene elementos dibujados
+        self._update_line_items(line)
+        self.update_label(line)
+    
+    def _update_line_items(self, line):
+        """Mueve la línea y sus puntos de anclaje en el canvas sin recrearlos."""
+        start_t = self._transform_point(*line["start"])
+        end_t = self._transform_point(*line["end"])
+        self.canvas.coords(line["line"], *start_t, *end_t)
+        
+        anchors = line.get("anchors")
+        if anchors:
+            radius = int(5 * self.zoom_level)
+            for oval, (x, y) in zip(anchors, (start_t, end_t)):
+                self.canvas.coords(oval, x - radius, y - radius, x + radius, y + radius)
     
     def _get_drawing_center(self):
         """Calcula el centro del bounding box del dibujo."""
         if not self.lines:
             # Si no hay líneas, retornar centro del canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
+            canvas_width = self._cw
+            canvas_height = self._ch
             return (canvas_width / 2, canvas_height / 2)
         
-        # Calcular bounding box
-        min_x = float('inf')
-        min_y = float('inf')
-        max_x = float('-inf')
-        max_y = float('-inf')
-        
-        for line in self.lines:
-            start_x, start_y = line["start"]
-            end_x, end_y = line["end"]
-            
-            min_x = min(min_x, start_x, end_x)
-            min_y = min(min_y, start_y, end_y)
-            max_x = max(max_x, start_x, end_x)
-            max_y = max(max_y, start_y, end_y)
-        
-        # Retornar centro
+        # Retornar centro del bounding box
+        min_x, min_y, max_x, max_y = self._drawing_bbox()
         return ((min_x + max_x) / 2, (min_y + max_y) / 2)
+    
+    def _drawing_bbox(self):
+        """
+        Bounding box (min_x, min_y, max_x, max_y) de todas las líneas, o None si no hay.
+        
+        Se calcula una sola vez por revisión de la geometría: cada cota lo consulta
+        para orientarse y no debe recorrer todas las líneas cada vez.
+        """
+        if self._bbox_revision != self._lines_revision:
+            self._bbox_revision = self._lines_revision
+            if self.lines:
+                # Una sola pasada desempaquetando cada extremo una vez y comparando
+                # con variables locales (más rápido que armar listas para min/max)
+                min_x, min_y = self.lines[0]["start"]
+                max_x, max_y = min_x, min_y
+                for line in self.lines:
+                    start_x, start_y = line["start"]
+                    end_x, end_y = line["end"]
+                    if start_x < min_x:
+                        min_x = start_x
+                    elif start_x > max_x:
+                        max_x = start_x
+                    if end_x < min_x:
+                        min_x = end_x
+                    elif end_x > max_x:
+                        max_x = end_x
+                    if start_y < min_y:
+                        min_y = start_y
+                    elif start_y > max_y:
+                        max_y = start_y
+                    if end_y < min_y:
+                        min_y = end_y
+                    elif end_y > max_y:
+                        max_y = end_y
+                self._bbox = (min_x, min_y, max_x, max_y)
+            else:
+                self._bbox = None
+        return self._bbox
 
     def create_label(self, start, end, length, line_index):
         """Crea acotación profesional con líneas de extensión y cota."""
-        # Calcular el ángulo de la línea
+        geometry = self._dimension_geometry(start, end)
+        line_width = max(1, int(1 * self.zoom_level))
+        
+        # Dibujar líneas de extensión (líneas finas, gris)
+        ext_line_1 = self.canvas.create_line(
+            *geometry['ext_lines'][0],
+            fill=_DIM_EXT_COLOR, width=line_width, tags=_DIM_TAGS
+        )
+        ext_line_2 = self.canvas.create_line(
+            *geometry['ext_lines'][1],
+            fill=_DIM_EXT_COLOR, width=line_width, tags=_DIM_TAGS
+        )
+        
+        # Dibujar línea de cota con sus flechas en un solo elemento
+        dim_line = self.canvas.create_polygon(
+            *geometry['dim_path'],
+            fill=_DIM_LINE_COLOR, outline=_DIM_LINE_COLOR, width=line_width, tags=_DIM_TAGS
+        )
+        
+        # Crear texto con fondo blanco para mejor legibilidad
+        label_bg = self.canvas.create_rectangle(
+            *geometry['bg'],
+            fill=_DIM_TEXT_BG, outline="", tags=_DIM_TAGS
+        )
+        
+        text_value = f"{length:.2f} m"
+        label = self.canvas.create_text(
+            *geometry['text'],
+            text=text_value,
+            font=_dimension_font(self.zoom_level),
+            fill=_DIM_TEXT_COLOR,
+            tags=_DIM_TAGS
+        )
+        
+        # Añadir evento de doble clic para editar
+        self.canvas.tag_bind(label, "<Double-1>", 
+                           lambda event, idx=line_index: self.on_label_double_click(idx))
+        
+        # Guardar referencias de todos los elementos de la acotación
+        label_data = {
+            'text': label,
+            'text_value': text_value,
+            'pixel_key': None,  # Posición en píxeles enteros de la última actualización
+            'text_xy': geometry['text'],  # Posición actual del texto en el canvas
+            'bg': label_bg,
+            'dim_line': dim_line,  # Línea de cota y flechas
+            'ext_lines': [ext_line_1, ext_line_2],
+            'index': line_index
+        }
+        self.labels.append(label_data)
+        self.lines[line_index]["label"] = label_data
+    
+    def _dimension_geometry(self, start, end):
+        """
+        Calcula, en coordenadas de canvas, la posición de todos los elementos de
+        la acotación de una línea (extensiones, cota, flechas, fondo y texto).
+        """
+        # Dirección de la línea como (coseno, seno), sin funciones trigonométricas
         dx = end[0] - start[0]
         dy = end[1] - start[1]
-        line_angle = math.atan2(dy, dx)
+        length = math.hypot(dx, dy)
+        if length:
+            cos_line = dx / length
+            sin_line = dy / length
+        else:
+            cos_line, sin_line = 1.0, 0.0  # Igual que atan2(0, 0) = 0
         
-        # Calcular el ángulo perpendicular (90° a la línea)
-        perp_angle = line_angle + math.pi / 2
+        # Dirección perpendicular (90° a la línea): cos(a + 90°) = -sen(a), sen(a + 90°) = cos(a)
+        cos_perp = -sin_line
+        sin_perp = cos_line
         
         # ESTRATEGIA INTELIGENTE: Colocar etiquetas según posición respecto al centro del dibujo
         # Calcular centro del dibujo
@@ -813,8 +1246,8 @@ class DrawingApp:
         to_line_y = line_mid_y - drawing_center[1]
         
         # Calcular offset perpendicular inicial
-        offset_x = math.cos(perp_angle) * self.DIMENSION_OFFSET
-        offset_y = math.sin(perp_angle) * self.DIMENSION_OFFSET
+        offset_x = cos_perp * self.DIMENSION_OFFSET
+        offset_y = sin_perp * self.DIMENSION_OFFSET
         
         # Producto punto: determina si el offset apunta hacia afuera o adentro
         # Si el producto punto es negativo, el offset apunta hacia el centro (mal)
@@ -824,46 +1257,22 @@ class DrawingApp:
         if dot_product < 0:
             offset_x = -offset_x
             offset_y = -offset_y
-            perp_angle += math.pi
-        
-        # Punto medio de la línea principal
-        mid_x = (start[0] + end[0]) / 2
-        mid_y = (start[1] + end[1]) / 2
+            cos_perp = -cos_perp
+            sin_perp = -sin_perp
         
         # --- LÍNEAS DE EXTENSIÓN ---
         # Calcular puntos para líneas de extensión desde los extremos
-        gap_x = math.cos(perp_angle) * self.EXTENSION_GAP
-        gap_y = math.sin(perp_angle) * self.EXTENSION_GAP
-        overshoot_x = math.cos(perp_angle) * (self.DIMENSION_OFFSET + self.EXTENSION_OVERSHOOT)
-        overshoot_y = math.sin(perp_angle) * (self.DIMENSION_OFFSET + self.EXTENSION_OVERSHOOT)
-        
-        # Línea de extensión 1 (desde start)
-        ext1_start_x = start[0] + gap_x
-        ext1_start_y = start[1] + gap_y
-        ext1_end_x = start[0] + overshoot_x
-        ext1_end_y = start[1] + overshoot_y
-        
-        # Línea de extensión 2 (desde end)
-        ext2_start_x = end[0] + gap_x
-        ext2_start_y = end[1] + gap_y
-        ext2_end_x = end[0] + overshoot_x
-        ext2_end_y = end[1] + overshoot_y
-        
-        # Dibujar líneas de extensión (líneas finas, gris)
-        # Aplicar transformaciones de zoom
-        ext1_start_t = self._transform_point(ext1_start_x, ext1_start_y)
-        ext1_end_t = self._transform_point(ext1_end_x, ext1_end_y)
-        ext2_start_t = self._transform_point(ext2_start_x, ext2_start_y)
-        ext2_end_t = self._transform_point(ext2_end_x, ext2_end_y)
-        
-        ext_line_1 = self.canvas.create_line(
-            *ext1_start_t, *ext1_end_t,
-            fill="#666", width=max(1, int(1 * self.zoom_level)), tags="dimension"
-        )
-        ext_line_2 = self.canvas.create_line(
-            *ext2_start_t, *ext2_end_t,
-            fill="#666", width=max(1, int(1 * self.zoom_level)), tags="dimension"
-        )
+        gap_x = cos_perp * self.EXTENSION_GAP
+        gap_y = sin_perp * self.EXTENSION_GAP
+        overshoot_x = cos_perp * (self.DIMENSION_OFFSET + self.EXTENSION_OVERSHOOT)
+        overshoot_y = sin_perp * (self.DIMENSION_OFFSET + self.EXTENSION_OVERSHOOT)
+        
+        # Línea de extensión 1 (desde start) y 2 (desde end), con transformaciones de zoom
+        ext_lines = [
+            (*self._transform_point(point[0] + gap_x, point[1] + gap_y),
+             *self._transform_point(point[0] + overshoot_x, point[1] + overshoot_y))
+            for point in (start, end)
+        ]
         
         # --- LÍNEA DE COTA ---
         # Puntos de inicio y fin de la línea de cota
@@ -871,110 +1280,79 @@ class DrawingApp:
         dim_start_y = start[1] + offset_y
         dim_end_x = end[0] + offset_x
         dim_end_y = end[1] + offset_y
-        
-        # Aplicar transformaciones
-        dim_start_t = self._transform_point(dim_start_x, dim_start_y)
-        dim_end_t = self._transform_point(dim_end_x, dim_end_y)
-        
-        # Dibujar línea de cota
-        dim_line = self.canvas.create_line(
-            *dim_start_t, *dim_end_t,
-            fill="#333", width=max(1, int(1 * self.zoom_level)), tags="dimension"
-        )
+        dim_line = (*self._transform_point(dim_start_x, dim_start_y),
+                    *self._transform_point(dim_end_x, dim_end_y))
         
         # --- FLECHAS EN LOS EXTREMOS ---
-        # Calcular puntos para las flechas
-        arrow1 = self._create_arrow_head(dim_start_x, dim_start_y, line_angle + math.pi)
-        arrow2 = self._create_arrow_head(dim_end_x, dim_end_y, line_angle)
+        # (la del inicio apunta en sentido contrario: ángulo + 180°)
+        arrow_start = self._arrow_head_points(dim_start_x, dim_start_y, -cos_line, -sin_line)
+        arrow_end = self._arrow_head_points(dim_end_x, dim_end_y, cos_line, sin_line)
         
-        # --- TEXTO DE DIMENSIÓN ---
-        # Colocar texto en el centro de la línea de cota
-        text_x = (dim_start_x + dim_end_x) / 2
-        text_y = (dim_start_y + dim_end_y) / 2
-        
-        # Aplicar transformación
-        text_t = self._transform_point(text_x, text_y)
+        # Cota y flechas como un solo polígono: punta → base → base → punta en cada
+        # extremo; el tramo entre puntas (ida y cierre) dibuja la línea de cota
+        dim_path = arrow_start + arrow_start[:2] + arrow_end + arrow_end[:2]
         
-        # Calcular ángulo del texto para que siempre sea legible
-        text_angle_deg = math.degrees(line_angle)
-        # Normalizar el ángulo para que el texto no aparezca al revés
-        if text_angle_deg > 90 or text_angle_deg < -90:
-            text_angle_deg += 180
+        # --- TEXTO DE DIMENSIÓN ---
+        # Colocar texto en el centro de la línea de cota (con transformación)
+        text_t = self._transform_point((dim_start_x + dim_end_x) / 2, (dim_start_y + dim_end_y) / 2)
         
-        # Tamaños escalados
+        # Fondo blanco del texto (tamaños escalados)
         rect_width = int(25 * self.zoom_level)
         rect_height = int(10 * self.zoom_level)
-        font_size = max(8, int(10 * self.zoom_level))
-        
-        # Crear texto con fondo blanco para mejor legibilidad
-        label_bg = self.canvas.create_rectangle(
-            text_t[0] - rect_width, text_t[1] - rect_height, 
-            text_t[0] + rect_width, text_t[1] + rect_height,
-            fill="white", outline="", tags="dimension"
-        )
-        
-        label = self.canvas.create_text(
-            *text_t,
-            text=f"{length:.2f} m",
-            font=("Arial", font_size),
-            fill="#000",
-            tags="dimension"
-        )
+        bg = (text_t[0] - rect_width, text_t[1] - rect_height,
+              text_t[0] + rect_width, text_t[1] + rect_height)
         
-        # Añadir evento de doble clic para editar
-        self.canvas.tag_bind(label, "<Double-1>", 
-                           lambda event, idx=line_index: self.on_label_double_click(idx))
-        
-        # Guardar referencias de todos los elementos de la acotación
-        self.labels.append({
-            'text': label,
-            'bg': label_bg,
+        return {
+            'ext_lines': ext_lines,
             'dim_line': dim_line,
-            'ext_lines': [ext_line_1, ext_line_2],
-            'arrows': arrow1 + arrow2,
-            'index': line_index
-        })
+            'dim_path': dim_path,
+            'text': text_t,
+            'bg': bg
+        }
     
-    def _create_arrow_head(self, x, y, angle):
-        """Crea una flecha en el punto especificado con el ángulo dado."""
+    def _arrow_head_points(self, x, y, cos_angle, sin_angle):
+        """
+        Calcula los tres puntos (transformados) de una flecha en (x, y) que apunta
+        en la dirección (cos_angle, sin_angle).
+        """
         # Calcular los tres puntos del triángulo de la flecha
         tip_x = x
         tip_y = y
         
-        # Base de la flecha (escalada)
+        # Base de la flecha (escalada) a ±150°, por suma de ángulos:
+        # cos(a ± 150°) = cos(a)·cos(150°) ∓ sen(a)·sen(150°)
+        # sen(a ± 150°) = sen(a)·cos(150°) ± cos(a)·sen(150°)
         arrow_size = self.ARROW_SIZE
-        base_angle1 = angle + math.radians(150)
-        base_angle2 = angle + math.radians(-150)
+        along = arrow_size * _COS_150
+        across = arrow_size * _SIN_150
         
-        base1_x = tip_x + arrow_size * math.cos(base_angle1)
-        base1_y = tip_y + arrow_size * math.sin(base_angle1)
-        base2_x = tip_x + arrow_size * math.cos(base_angle2)
-        base2_y = tip_y + arrow_size * math.sin(base_angle2)
+        base1_x = tip_x + cos_angle * along - sin_angle * across
+        base1_y = tip_y + sin_angle * along + cos_angle * across
+        base2_x = tip_x + cos_angle * along + sin_angle * across
+        base2_y = tip_y + sin_angle * along - cos_angle * across
         
         # Aplicar transformaciones de zoom
-        tip_t = self._transform_point(tip_x, tip_y)
-        base1_t = self._transform_point(base1_x, base1_y)
-        base2_t = self._transform_point(base2_x, base2_y)
-        
-        # Crear polígono de flecha
-        arrow = self.canvas.create_polygon(
-            *tip_t, *base1_t, *base2_t,
-            fill="#333", outline="#333", tags="dimension"
-        )
-        
-        return [arrow]
-
+        return (*self._transform_point(tip_x, tip_y),
+                *self._transform_point(base1_x, base1_y),
+                *self._transform_point(base2_x, base2_y))
+    
     def on_label_right_click(self, event):
         clicked_label = None
         for label_data in self.labels:
-            label = label_data['text']
-            index = label_data['index']
-            coords = self.canvas.coords(label)
-            if coords:
-                x, y = coords
-                if abs(event.x - x) < 30 and abs(event.y - y) < 15:
-                    clicked_label = index
-                    break
+            x, y = label_data['text_xy']
+            if abs(event.x - x) < 30 and abs(event.y - y) < 15:
+                clicked_label = label_data['index']
+                break
+
+        if clicked_label is None:
+            # Las líneas sin cota dibujada (ocultas o cortas en pantalla) se editan
+            # con clic derecho sobre la propia línea
+            world_x, world_y = self._inverse_transform_point(event.x, event.y)
+            tolerance = 10 / self.zoom_level
+            candidates = self._nearby_segments(world_x, world_y, tolerance)
+            nearest = _nearest_segment(world_x, world_y, self.segment_terms, tolerance, candidates)
+            if nearest >= 0 and self.lines[nearest].get("label") is None:
+                clicked_label = nearest
 
         if clicked_label is not None:
             new_length = askfloat("Editar Longitud", "Introduce la nueva longitud (en metros):")
@@ -995,21 +1373,41 @@ class DrawingApp:
             line["start"][1] + scaled_length * math.sin(angle)
         )
         line["length"] = new_length
-        self.canvas.coords(line["line"], *line["start"], *line["end"])
-        self.update_label(line)
-        self.redraw_canvas()
+        self._lines_revision += 1
+        self._redraw_one(line)
+        self._reposition_canvas()
         self.mark_unsaved_changes()
 
     def update_label(self, line):
         """Actualiza la acotación cuando cambia una línea."""
-        # Simplemente redibujar todo es más fácil con el nuevo sistema
-        # ya que la acotación es compleja
-        self.redraw_canvas()
+        label_data = line.get("label")
+        if label_data is None:
+            return  # Cota oculta o todavía sin dibujar
+        
+        # Mover los elementos existentes de esta acotación sin recrearlos
+        geometry = self._dimension_geometry(line["start"], line["end"])
+        
+        # Si la línea de cota no cambia de píxel, Tk la dibujaría igual: no mover nada
+        pixel_key = tuple(round(value) for value in geometry['dim_line'])
+        if pixel_key != label_data['pixel_key']:
+            label_data['pixel_key'] = pixel_key
+            set_coords = self.canvas.coords
+            for item, coords in zip(label_data['ext_lines'], geometry['ext_lines']):
+                set_coords(item, *coords)
+            set_coords(label_data['dim_line'], *geometry['dim_path'])
+            set_coords(label_data['bg'], *geometry['bg'])
+            set_coords(label_data['text'], *geometry['text'])
+            label_data['text_xy'] = geometry['text']
+        
+        # Solo reconfigurar el texto si cambia lo que se muestra (2 decimales)
+        text_value = f"{line['length']:.2f} m"
+        if text_value != label_data['text_value']:
+            self.canvas.itemconfig(label_data['text'], text=text_value)
+            label_data['text_value'] = text_value
 
     def calculate_length(self, start, end):
-        dx = (end[0] - start[0]) / self.SCALE
-        dy = (end[1] - start[1]) / self.SCALE
-        return math.sqrt(dx ** 2 + dy ** 2)
+        inv = self._INV_SCALE
+        return math.hypot((end[0] - start[0]) * inv, (end[1] - start[1]) * inv)
 
     def calculate_angle(self, start, end):
         dx = end[0] - start[0]
@@ -1022,19 +1420,24 @@ class DrawingApp:
         end_t = self._transform_point(*end)
         radius = int(5 * self.zoom_level)
         
-        self.canvas.create_oval(start_t[0]-radius, start_t[1]-radius, start_t[0]+radius, start_t[1]+radius, fill="red")
-        self.canvas.create_oval(end_t[0]-radius, end_t[1]-radius, end_t[0]+radius, end_t[1]+radius, fill="red")
+        start_oval = self.canvas.create_oval(start_t[0]-radius, start_t[1]-radius, start_t[0]+radius, start_t[1]+radius, fill="red")
+        end_oval = self.canvas.create_oval(end_t[0]-radius, end_t[1]-radius, end_t[0]+radius, end_t[1]+radius, fill="red")
+        return (start_oval, end_oval)
 
     def clear_canvas(self):
         self.canvas.delete("all")
+        self._compass_pos = None  # La rosa de los vientos se vuelve a crear al redibujar
         self.start_point = None
         self.lines.clear()
+        self._lines_revision += 1
         self.labels.clear()
         self.text_labels.clear()  # Limpiar etiquetas de texto
         self.current_y_offset = 0  # Reiniciar el desplazamiento vertical al limpiar el canvas
 
     def redraw_canvas(self):
-        self.canvas.delete("all")
+        # Las etiquetas de texto personalizadas y la rosa de los vientos se conservan
+        self.canvas.delete("all&&!text_label&&!compass")
+        self.labels.clear()  # Las acotaciones se recrean con el resto de elementos
         
         # Redibujar zonas primero (para que queden detrás)
         for zone in self.zone_manager.get_all_zones():
@@ -1044,7 +1447,8 @@ class DrawingApp:
         if self.multi_measure_mode and len(self.selected_lines_for_measure) >= 3:
             self._redraw_measure_shadow()
         
-        # Redibujar líneas con transformación de zoom
+        # Redibujar líneas con transformación de zoom (solo las que caen en la vista)
+        region = self._visible_region()
         for i, line in enumerate(self.lines):
             # Color especial para líneas seleccionadas
             if self.multi_measure_mode and i in self.selected_lines_for_measure:
@@ -1064,69 +1468,193 @@ class DrawingApp:
             start_transformed = self._transform_point(*line["start"])
             end_transformed = self._transform_point(*line["end"])
             
-            self.canvas.create_line(*start_transformed, *end_transformed, fill=color, width=int(width * self.zoom_level))
-            # Solo crear etiqueta si la cota está visible
-            if line.get("dimension_visible", True):
+            # Fuera de la vista no se crean sus elementos; se dibujará cuando vuelva a verse
+            if not self._segment_in_region(start_transformed, end_transformed, region):
+                line["line"] = None
+                line["label"] = None
+                line["anchors"] = None
+                continue
+            
+            # Guardar los IDs para poder mover los elementos sin recrearlos
+            line["line"] = self.canvas.create_line(*start_transformed, *end_transformed, fill=color, width=int(width * self.zoom_level))
+            # Solo crear etiqueta si la cota está visible y la línea se ve con tamaño suficiente
+            if self._label_wanted(line, start_transformed, end_transformed):
                 self.create_label(line["start"], line["end"], line["length"], i)
-            self.draw_anchor_points(line["start"], line["end"])
+            else:
+                line["label"] = None
+            line["anchors"] = self.draw_anchor_points(line["start"], line["end"])
         
         # Redibujar etiquetas de texto personalizadas
+        self._draw_text_labels()
+        
+        # Dibujar rosa de los vientos (siempre al final, encima de todo)
+        self.draw_compass()
+
+    def _draw_text_labels(self):
+        """Coloca las etiquetas de texto personalizadas, reutilizando sus elementos si existen."""
         for i, label_data in enumerate(self.text_labels):
             angle = label_data.get('angle', 0)
             
             # Aplicar transformación de zoom
             pos_transformed = self._transform_point(label_data['x'], label_data['y'])
+            font = ("Arial", int(14 * self.zoom_level), "bold")
             
-            # Crear texto primero para obtener su bbox
-            text_id = self.canvas.create_text(
-                pos_transformed[0], pos_transformed[1],
-                text=label_data['text'],
-                font=("Arial", int(14 * self.zoom_level), "bold"),
-                fill="#333",
-                angle=angle,  # Tkinter soporta rotación de texto con el parámetro 'angle'
-                tags="text_label"
-            )
-            
-            # Obtener bounding box del texto rotado
-            bbox = self.canvas.bbox(text_id)
-            if bbox:
-                # No crear rectángulo de fondo - etiqueta transparente
-                bg_rect = None
-                
-                # Subir el texto para que quede encima
-                self.canvas.tag_raise(text_id)
+            text_id = label_data.get('text_id')
+            if text_id is not None and self.canvas.type(text_id):
+                # Reutilizar el elemento existente
+                self.canvas.coords(text_id, *pos_transformed)
+                self.canvas.itemconfig(text_id, text=label_data['text'], font=font, angle=angle)
             else:
-                # Fallback - sin fondo
-                bg_rect = None
-                self.canvas.tag_raise(text_id)
+                text_id = self.canvas.create_text(
+                    pos_transformed[0], pos_transformed[1],
+                    text=label_data['text'],
+                    font=font,
+                    fill="#333",
+                    angle=angle,  # Tkinter soporta rotación de texto con el parámetro 'angle'
+                    tags="text_label"
+                )
+            
+            # Subir el texto para que quede encima (etiqueta transparente, sin fondo)
+            self.canvas.tag_raise(text_id)
             
             # Actualizar referencias
             label_data['text_id'] = text_id
-            label_data['bg_id'] = bg_rect
+            label_data['bg_id'] = None
             
             # Bindings para arrastrar (solo en texto ya que no hay fondo)
             self.canvas.tag_bind(text_id, "<Button-1>", lambda e, idx=i: self.start_drag_text_label(e, idx))
             
             # Bindings para rotación (clic derecho)
             self.canvas.tag_bind(text_id, "<Button-3>", lambda e, idx=i: self.show_rotation_control(idx))
-            self.canvas.tag_bind(text_id, "<Button-1>", lambda e, idx=i: self.start_drag_text_label(e, idx))
+
+    def _reposition_canvas(self):
+        """
+        Mueve los elementos ya dibujados cuando solo cambian las coordenadas de
+        las líneas (rotación), sin borrar ni recrear líneas, cotas ni anclajes.
         
-        # Dibujar rosa de los vientos (siempre al final, encima de todo)
-        self.draw_compass()
+        Las zonas y la sombra de medición dependen de varias líneas a la vez y
+        se vuelven a crear; si falta algún elemento se hace un redibujado completo.
+        """
+        # Una línea sin dibujar que ahora entra en la vista requiere el redibujado completo
+        # (o una línea dibujada que gana o pierde su cota por su longitud en pantalla)
+        region = self._visible_region()
+        for line in self.lines:
+            start_t = self._transform_point(*line["start"])
+            end_t = self._transform_point(*line["end"])
+            if line.get("line") is None:
+                needs_redraw = self._segment_in_region(start_t, end_t, region)
+            else:
+                needs_redraw = (line.get("label") is None) == self._label_wanted(line, start_t, end_t)
+            if needs_redraw:
+                self.redraw_canvas()
+                return
+        
+        # Recrear zonas y sombra de medición
+        zones = self.zone_manager.get_all_zones()
+        for zone_id in {*self.zone_canvas_items, *(zone.id for zone in zones)}:
+            self.canvas.delete(f"zone_{zone_id}")
+        self.zone_canvas_items.clear()
+        self.canvas.delete("measure_shadow", "measure_virtual")
+        
+        for zone in zones:
+            self.visualize_zone(zone)
+        if self.multi_measure_mode and len(self.selected_lines_for_measure) >= 3:
+            self._redraw_measure_shadow()
+        
+        # Mantenerlas debajo de las líneas, como en el redibujado completo
+        first_line = next((line["line"] for line in self.lines if line.get("line") is not None), None)
+        if first_line is not None:
+            for items in self.zone_canvas_items.values():
+                self.canvas.tag_lower(items['label'], first_line)
+            self.canvas.tag_lower("measure_virtual", first_line)
+        
+        # Mover líneas, anclajes y cotas existentes (las que quedaron fuera de la vista no tienen)
+        for line in self.lines:
+            if line.get("line") is not None:
+                self._update_line_items(line)
+                self.update_label(line)
+        
+        self._draw_text_labels()
+        
+        # La rosa de los vientos no se mueve, pero debe seguir encima de todo
+        self.canvas.tag_raise("compass")
+
+    def toggle_show_labels(self):
+        """Muestra u oculta todas las cotas según la casilla de la barra de herramientas."""
+        self.show_labels = self.show_labels_var.get()
+        self.redraw_canvas()
+    
+    def _label_wanted(self, line, start_t, end_t):
+        """
+        Indica si la línea debe mostrar su cota: que estén activadas, que la suya no
+        esté oculta y, en planos de más de LABEL_LOD_LINES líneas, que en pantalla
+        mida al menos MIN_LABEL_PX (más corta, la cota taparía la línea y las vecinas).
+        """
+        if not (self.show_labels and line.get("dimension_visible", True)):
+            return False
+        return len(self.lines) <= self.LABEL_LOD_LINES or (
+            math.hypot(end_t[0] - start_t[0], end_t[1] - start_t[1]) >= self.MIN_LABEL_PX
+        )
+    
+    def _visible_region(self):
+        """
+        Rectángulo visible del canvas, ampliado con VIEWPORT_MARGIN para que las
+        cotas de líneas junto al borde no se recorten. None si el canvas aún no
+        tiene tamaño (todavía no se mostró), en cuyo caso no se recorta nada.
+        """
+        canvas_width = self._cw
+        canvas_height = self._ch
+        if canvas_width <= 1 or canvas_height <= 1:
+            return None
+        margin = self.VIEWPORT_MARGIN * self.zoom_level
+        return (-margin, -margin, canvas_width + margin, canvas_height + margin)
+    
+    @staticmethod
+    def _segment_in_region(start, end, region):
+        """Indica si el rectángulo que envuelve al segmento toca la región (o no hay región)."""
+        if region is None:
+            return True
+        min_x, min_y, max_x, max_y = region
+        return not (
+            (start[0] < min_x and end[0] < min_x) or (start[0] > max_x and end[0] > max_x) or
+            (start[1] < min_y and end[1] < min_y) or (start[1] > max_y and end[1] > max_y)
+        )
+    
+    def _on_canvas_configure(self, event):
+        """Guarda el nuevo tamaño del canvas y agrupa los cambios en un solo redibujado."""
+        self._cw = event.width
+        self._ch = event.height
+        if not self._configure_pending:
+            self._configure_pending = True
+            self.root.after_idle(self._redraw_after_configure)
+    
+    def _redraw_after_configure(self):
+        self._configure_pending = False
+        self.redraw_canvas()
 
     def draw_compass(self):
         """Dibuja la rosa de los vientos estática en la esquina superior derecha."""
-        canvas_width = self.canvas.winfo_width()
+        canvas_width = self._cw
         
         # Posición en esquina superior derecha
         cx = canvas_width - self.compass_size - 20
         cy = self.compass_size + 20
         
+        # Sus elementos no cambian de forma: si ya existen solo se desplazan y se suben
+        if self._compass_pos is not None:
+            old_cx, old_cy = self._compass_pos
+            if (cx, cy) != (old_cx, old_cy):
+                self.canvas.move("compass", cx - old_cx, cy - old_cy)
+                self._compass_pos = (cx, cy)
+            self.canvas.tag_raise("compass")
+            return
+        self._compass_pos = (cx, cy)
+        
         # Círculo de fondo
         self.canvas.create_oval(
             cx - self.compass_size//2, cy - self.compass_size//2,
             cx + self.compass_size//2, cy + self.compass_size//2,
-            fill="white", outline="#333", width=2
+            fill="white", outline="#333", width=2, tags=_COMPASS_TAGS
         )
         
         # Líneas de los puntos cardinales
@@ -1135,41 +1663,41 @@ class DrawingApp:
         # Norte (arriba) - Rojo
         self.canvas.create_line(
             cx, cy, cx, cy - radius,
-            fill="red", width=3, arrow=tk.LAST
+            fill="red", width=3, arrow=tk.LAST, tags=_COMPASS_TAGS
         )
         self.canvas.create_text(
             cx, cy - radius - 12,
-            text="N", font=("Arial", 12, "bold"), fill="red"
+            text="N", font=_COMPASS_NORTH_FONT, fill="red", tags=_COMPASS_TAGS
         )
         
         # Sur (abajo)
         self.canvas.create_line(
             cx, cy, cx, cy + radius,
-            fill="#666", width=2
+            fill="#666", width=2, tags=_COMPASS_TAGS
         )
         self.canvas.create_text(
             cx, cy + radius + 12,
-            text="S", font=("Arial", 10), fill="#666"
+            text="S", font=_COMPASS_FONT, fill="#666", tags=_COMPASS_TAGS
         )
         
         # Este (derecha)
         self.canvas.create_line(
             cx, cy, cx + radius, cy,
-            fill="#666", width=2
+            fill="#666", width=2, tags=_COMPASS_TAGS
         )
         self.canvas.create_text(
             cx + radius + 12, cy,
-            text="E", font=("Arial", 10), fill="#666"
+            text="E", font=_COMPASS_FONT, fill="#666", tags=_COMPASS_TAGS
         )
         
         # Oeste (izquierda)
         self.canvas.create_line(
             cx, cy, cx - radius, cy,
-            fill="#666", width=2
+            fill="#666", width=2, tags=_COMPASS_TAGS
         )
         self.canvas.create_text(
             cx - radius - 12, cy,
-            text="O", font=("Arial", 10), fill="#666"
+            text="O", font=_COMPASS_FONT, fill="#666", tags=_COMPASS_TAGS
         )
     
     def rotate_drawing(self, angle_increment):
@@ -1181,133 +1709,105 @@ class DrawingApp:
             )
             return
         
-        # Actualizar ángulo de rotación
-        self.rotation_angle = (self.rotation_angle + angle_increment) % 360
-        
-        # Obtener centro del canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        center_x = canvas_width / 2
-        center_y = canvas_height / 2
-        
-        # Convertir ángulo a radianes
-        angle_rad = math.radians(angle_increment)
-        cos_angle = math.cos(angle_rad)
-        sin_angle = math.sin(angle_rad)
-        
-        # Rotar todas las líneas
-        for line in self.lines:
-            # Rotar punto de inicio
-            start_x, start_y = line["start"]
-            rel_x = start_x - center_x
-            rel_y = start_y - center_y
-            new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-            new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
-            line["start"] = (new_x, new_y)
-            
-            # Rotar punto final
-            end_x, end_y = line["end"]
-            rel_x = end_x - center_x
-            rel_y = end_y - center_y
-            new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-            new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
-            line["end"] = (new_x, new_y)
+        # Rotar alrededor del centro del canvas partiendo del estado actual
+        self._apply_rotation(
+            angle_increment,
+            (self._cw / 2, self._ch / 2),
+            [point for line in self.lines for point in (line["start"], line["end"])],
+            [(label_data['x'], label_data['y']) for label_data in self.text_labels],
+            [label_data.get('angle', 0) for label_data in self.text_labels],
+            self.rotation_angle
+        )
         
-        # Rotar todas las etiquetas de texto
-        for label_data in self.text_labels:
-            # Rotar posición de la etiqueta
-            label_x, label_y = label_data['x'], label_data['y']
-            rel_x = label_x - center_x
-            rel_y = label_y - center_y
-            new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-            new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
+        log.debug("Plano rotado %s°. Orientación actual: %s°", angle_increment, self.rotation_angle)
+        self.mark_unsaved_changes()
+    
+    def _apply_rotation(self, angle, center, endpoints, label_positions, label_angles, base_rotation):
+        """
+        Rota el dibujo `angle` grados alrededor de `center` partiendo de los extremos
+        (inicio, fin, inicio, ...), posiciones y ángulos de etiquetas y orientación dados,
+        y mueve los elementos del canvas a la nueva posición.
+        """
+        center_x, center_y = center
+        
+        # Rotar todos los extremos de las líneas en una sola pasada
+        endpoints = _rotate_points(endpoints, angle, center_x, center_y)
+        for line, start, end in zip(self.lines, endpoints[0::2], endpoints[1::2]):
+            line["start"] = start
+            line["end"] = end
+        self._lines_revision += 1
+        
+        # Rotar todas las etiquetas de texto, también su ángulo
+        positions = _rotate_points(label_positions, angle, center_x, center_y)
+        for label_data, (new_x, new_y), label_angle in zip(self.text_labels, positions, label_angles):
             label_data['x'] = new_x
             label_data['y'] = new_y
-            
-            # Rotar el ángulo de la etiqueta también
-            label_data['angle'] = label_data.get('angle', 0) + angle_increment
+            label_data['angle'] = label_angle + angle
+        
+        # Ángulo de rotación total
+        self.rotation_angle = (base_rotation + angle) % 360
         
         # Actualizar label de orientación
         self.orientation_label.config(text=f"Rotación: {self.rotation_angle}°")
         
-        # Redibujar
-        self.redraw_canvas()
-        
-        print(f"Plano rotado {angle_increment}°. Orientación actual: {self.rotation_angle}°")
-        self.mark_unsaved_changes()
+        # Mover los elementos existentes a la nueva posición
+        self._reposition_canvas()
     
     def on_slider_moved(self, value):
         """Se llama mientras se arrastra el slider."""
-        slider_value = int(float(value))
-        
-        # Solo rotar si hay líneas
-        if self.lines:
-            # Calcular incremento desde la última posición
-            angle_increment = slider_value - getattr(self, '_last_slider_value', 0)
-            
-            if angle_increment != 0:
-                # Obtener centro del canvas
-                canvas_width = self.canvas.winfo_width()
-                canvas_height = self.canvas.winfo_height()
-                center_x = canvas_width / 2
-                center_y = canvas_height / 2
-                
-                # Convertir ángulo a radianes
-                angle_rad = math.radians(angle_increment)
-                cos_angle = math.cos(angle_rad)
-                sin_angle = math.sin(angle_rad)
-                
-                # Rotar todas las líneas
-                for line in self.lines:
-                    # Rotar punto de inicio
-                    start_x, start_y = line["start"]
-                    rel_x = start_x - center_x
-                    rel_y = start_y - center_y
-                    new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-                    new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
-                    line["start"] = (new_x, new_y)
-                    
-                    # Rotar punto final
-                    end_x, end_y = line["end"]
-                    rel_x = end_x - center_x
-                    rel_y = end_y - center_y
-                    new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-                    new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
-                    line["end"] = (new_x, new_y)
-                
-                # Rotar todas las etiquetas de texto
-                for label_data in self.text_labels:
-                    # Rotar posición de la etiqueta
-                    label_x, label_y = label_data['x'], label_data['y']
-                    rel_x = label_x - center_x
-                    rel_y = label_y - center_y
-                    new_x = rel_x * cos_angle - rel_y * sin_angle + center_x
-                    new_y = rel_x * sin_angle + rel_y * cos_angle + center_y
-                    label_data['x'] = new_x
-                    label_data['y'] = new_y
-                    
-                    # Rotar el ángulo de la etiqueta también
-                    label_data['angle'] = label_data.get('angle', 0) + angle_increment
-                
-                # Actualizar ángulo de rotación total
-                self.rotation_angle = (self.rotation_angle + angle_increment) % 360
-                
-                # Actualizar label de orientación
-                self.orientation_label.config(text=f"Rotación: {self.rotation_angle}°")
-                
-                # Redibujar
-                self.redraw_canvas()
-            
-            # Guardar valor actual
-            self._last_slider_value = slider_value
+        # Agrupar ráfagas de eventos: solo se rota una vez cuando Tk queda libre
+        self._pending_slider_value = int(float(value))
+        if self._slider_after_id is None:
+            self._slider_after_id = self.root.after_idle(self._flush_rotation)
+    
+    def _flush_rotation(self):
+        """
+        Aplica la rotación del slider de forma absoluta: cada posición se calcula
+        desde las coordenadas que había al empezar a arrastrarlo, sin acumular
+        errores de redondeo entre eventos.
+        """
+        self._slider_after_id = None
+        slider_value = self._pending_slider_value
+        
+        # Solo rotar si hay líneas y el valor cambió
+        if not self.lines or slider_value == self._last_slider_value:
+            return
+        
+        origin = self._slider_origin
+        if origin is None:
+            # Primer movimiento del arrastre: guardar el estado de partida y el centro del canvas
+            canvas_width = self._cw
+            canvas_height = self._ch
+            origin = self._slider_origin = {
+                'center': (canvas_width / 2, canvas_height / 2),
+                'endpoints': [point for line in self.lines for point in (line["start"], line["end"])],
+                'labels': [(label_data['x'], label_data['y']) for label_data in self.text_labels],
+                'label_angles': [label_data.get('angle', 0) for label_data in self.text_labels],
+                'rotation_angle': self.rotation_angle
+            }
+        self._apply_rotation(
+            slider_value, origin['center'], origin['endpoints'],
+            origin['labels'], origin['label_angles'], origin['rotation_angle']
+        )
+        
+        # Guardar valor aplicado
+        self._last_slider_value = slider_value
     
     def on_slider_released(self, event):
         """Se llama al soltar el slider - vuelve al centro."""
+        # Aplicar la última posición antes de volver al centro
+        if self._slider_after_id is not None:
+            self.root.after_cancel(self._slider_after_id)
+            self._flush_rotation()
+        
+        # El próximo arrastre parte de las coordenadas actuales
+        self._slider_origin = None
+        
         # Resetear el slider al centro
-        self.rotation_slider.set(0)
         self._last_slider_value = 0
+        self.rotation_slider.set(0)
         
-        print(f"Rotación aplicada. Orientación final: {self.rotation_angle}°")
+        log.debug("Rotación aplicada. Orientación final: %s°", self.rotation_angle)
     
     def center_drawing(self):
         """Centra todo el dibujo en el canvas."""
@@ -1319,33 +1819,15 @@ class DrawingApp:
             return
         
         # Calcular el bounding box de todas las líneas
-        min_x = float('inf')
-        min_y = float('inf')
-        max_x = float('-inf')
-        max_y = float('-inf')
-        
-        for line in self.lines:
-            # Verificar punto de inicio
-            start_x, start_y = line["start"]
-            min_x = min(min_x, start_x)
-            min_y = min(min_y, start_y)
-            max_x = max(max_x, start_x)
-            max_y = max(max_y, start_y)
-            
-            # Verificar punto final
-            end_x, end_y = line["end"]
-            min_x = min(min_x, end_x)
-            min_y = min(min_y, end_y)
-            max_x = max(max_x, end_x)
-            max_y = max(max_y, end_y)
+        min_x, min_y, max_x, max_y = self._drawing_bbox()
         
         # Calcular centro del dibujo actual
         drawing_center_x = (min_x + max_x) / 2
         drawing_center_y = (min_y + max_y) / 2
         
         # Calcular centro del canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+        canvas_width = self._cw
+        canvas_height = self._ch
         canvas_center_x = canvas_width / 2
         canvas_center_y = canvas_height / 2
         
@@ -1356,10 +1838,14 @@ class DrawingApp:
         # Aplicar desplazamiento a todas las líneas
         for line in self.lines:
             start_x, start_y = line["start"]
-            line["start"] = (start_x + offset_x, start_y + offset_y)
-            
             end_x, end_y = line["end"]
+            line["start"] = (start_x + offset_x, start_y + offset_y)
             line["end"] = (end_x + offset_x, end_y + offset_y)
+        self._lines_revision += 1
+        
+        # Una traslación solo desplaza el bounding box: actualizarlo sin recalcularlo
+        self._bbox = (min_x + offset_x, min_y + offset_y, max_x + offset_x, max_y + offset_y)
+        self._bbox_revision = self._lines_revision
         
         # Aplicar desplazamiento a todas las etiquetas de texto
         for label_data in self.text_labels:
@@ -1369,7 +1855,7 @@ class DrawingApp:
         # Redibujar
         self.redraw_canvas()
         
-        print(f"Dibujo centrado. Desplazamiento: ({offset_x:.1f}, {offset_y:.1f})")
+        log.debug("Dibujo centrado. Desplazamiento: (%.1f, %.1f)", offset_x, offset_y)
         self.mark_unsaved_changes()
         
         # Contar elementos centrados
@@ -1396,8 +1882,8 @@ class DrawingApp:
             return
         
         # Calcular centro del canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+        canvas_width = self._cw
+        canvas_height = self._ch
         center_x = canvas_width / 2
         center_y = canvas_height / 2
         
@@ -1437,7 +1923,7 @@ class DrawingApp:
             "• Clic derecho para rotar la etiqueta 🔄"
         )
         
-        print(f"Etiqueta '{text}' añadida en el centro ({center_x}, {center_y}).")
+        log.debug("Etiqueta '%s' añadida en el centro (%s, %s).", text, center_x, center_y)
         self.mark_unsaved_changes()
 
     def add_extra_label(self, event):
@@ -1494,24 +1980,33 @@ class DrawingApp:
         # Buscar si el doble clic fue sobre una etiqueta de texto
         items = self.canvas.find_overlapping(event.x - 5, event.y - 5, event.x + 5, event.y + 5)
         
+        # Mapa ID de canvas -> etiqueta, para no recorrer todas las etiquetas por cada item
+        labels_by_item = {}
+        for label_data in self.text_labels:
+            labels_by_item[label_data['text_id']] = label_data
+            if label_data['bg_id'] is not None:
+                labels_by_item[label_data['bg_id']] = label_data
+        
         for item in items:
             # Verificar si es una etiqueta de texto
-            for i, label_data in enumerate(self.text_labels):
-                if item == label_data['text_id'] or item == label_data['bg_id']:
-                    # Editar texto
-                    new_text = askstring(
-                        "Editar Etiqueta",
-                        "Nuevo texto:",
-                        initialvalue=label_data['text']
-                    )
-                    
-                    if new_text and new_text.strip():
-                        # Actualizar texto
-                        self.canvas.itemconfig(label_data['text_id'], text=new_text.strip())
-                        label_data['text'] = new_text.strip()
-                        print(f"Etiqueta editada: '{new_text.strip()}'")
-                    
-                    return
+            label_data = labels_by_item.get(item)
+            if label_data is None:
+                continue
+            
+            # Editar texto
+            new_text = askstring(
+                "Editar Etiqueta",
+                "Nuevo texto:",
+                initialvalue=label_data['text']
+            )
+            
+            if new_text and new_text.strip():
+                # Actualizar texto
+                self.canvas.itemconfig(label_data['text_id'], text=new_text.strip())
+                label_data['text'] = new_text.strip()
+                log.debug("Etiqueta editada: '%s'", new_text.strip())
+            
+            return
     
     def show_rotation_control(self, index):
         """Muestra una ventana de control para rotar la etiqueta seleccionada."""
@@ -1607,7 +2102,7 @@ class DrawingApp:
             width=15
         ).pack(pady=(10, 0))
         
-        print(f"Control de rotación abierto para etiqueta: '{label_data['text']}'")
+        log.debug("Control de rotación abierto para etiqueta: '%s'", label_data['text'])
     
     def rotate_text_label(self, index, angle):
         """Rota una etiqueta de texto al ángulo especificado."""
@@ -1624,7 +2119,7 @@ class DrawingApp:
         # Redibujar el canvas para aplicar la rotación
         self.redraw_canvas()
         
-        print(f"Etiqueta '{label_data['text']}' rotada a {angle:.0f}°")
+        log.debug("Etiqueta '%s' rotada a %.0f°", label_data['text'], angle)
         self.mark_unsaved_changes()
 
     def export_to_svg(self):
@@ -1633,30 +2128,41 @@ class DrawingApp:
         if not file_path:
             return
 
-        # Obtener dimensiones del canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+        # Obtener dimensiones del canvas y las zonas una sola vez para toda la exportación
+        canvas_width = self._cw
+        canvas_height = self._ch
+        zones = self.zone_manager.get_all_zones()
 
-        # Crear el contenido SVG con dimensiones
-        svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{canvas_width}" height="{canvas_height}">\n'
+        # Escribir los fragmentos SVG directamente en el archivo
+        try:
+            with open(file_path, "w", buffering=1 << 20, encoding="utf-8") as svg_file:
+                svg_file.writelines(self._svg_fragments(canvas_width, canvas_height, zones))
+            
+            messagebox.showinfo(
+                "Exportación Exitosa",
+                f"✅ Archivo SVG guardado en:\n{file_path}\n\n"
+                f"Zonas exportadas: {len(zones)}\n"
+                f"Orientación: {self.rotation_angle}°"
+            )
+            log.debug("Archivo SVG guardado correctamente en %s", file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al guardar el archivo SVG:\n{e}")
+            log.error("Error al guardar el archivo SVG: %s", e)
+    
+    def _svg_fragments(self, canvas_width, canvas_height, zones):
+        """Genera los fragmentos del SVG en orden, para escribirlos sin armar el documento completo."""
+        # Encabezado SVG con dimensiones
+        yield f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{canvas_width}" height="{canvas_height}">\n'
         
         # Exportar zonas primero (para que queden detrás de las líneas)
-        for zone in self.zone_manager.get_all_zones():
+        for zone in zones:
             # Obtener puntos del polígono
-            polygon_points = []
-            for line_idx in zone.line_indices:
-                if line_idx < len(self.lines):
-                    line_data = self.lines[line_idx]
-                    if not polygon_points:
-                        polygon_points.append(f"{line_data['start'][0]},{line_data['start'][1]}")
-                    polygon_points.append(f"{line_data['end'][0]},{line_data['end'][1]}")
+            polygon_points = self._zone_polygon(zone)
             
             if len(polygon_points) >= 3:
-                points_str = " ".join(polygon_points)
+                points_str = " ".join(["%s,%s" % (x, y) for x, y in polygon_points])
                 # Crear polígono con color semitransparente
-                svg_content += f'  <polygon points="{points_str}" '
-                svg_content += f'fill="{zone.color}" fill-opacity="0.3" '
-                svg_content += f'stroke="{zone.color}" stroke-width="2" />\n'
+                yield _SVG_POLYGON_FMT % (points_str, zone.color, zone.color)
                 
                 # Agregar etiqueta de la zona
                 centroid = self.zone_manager.get_zone_centroid(zone.id, self.lines)
@@ -1665,24 +2171,26 @@ class DrawingApp:
                     # Separar el label en líneas para SVG
                     label_lines = zone_label.split('\n')
                     for i, label_line in enumerate(label_lines):
-                        svg_content += f'  <text x="{centroid[0]}" y="{centroid[1] + i * 15}" '
-                        svg_content += f'font-family="Arial" font-size="11" font-weight="bold" '
-                        svg_content += f'fill="#333" text-anchor="middle">{label_line}</text>\n'
+                        yield _SVG_ZONE_TEXT_FMT % (centroid[0], centroid[1] + i * 15, label_line)
         
         # Exportar líneas
         for line in self.lines:
-            start_x, start_y = line["start"]
-            end_x, end_y = line["end"]
-            svg_content += f'  <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" '
-            svg_content += f'style="stroke:black;stroke-width:2" />\n'
+            yield _SVG_LINE_FMT % (*line["start"], *line["end"])
 
         # Agregar etiquetas de dimensiones al SVG
-        for label, index in self.labels:
-            coords = self.canvas.coords(label)
-            if coords:  # Asegurarse de que las coordenadas se obtienen correctamente
-                x, y = coords
-                text = self.canvas.itemcget(label, "text")
-                svg_content += f'  <text x="{x}" y="{y}" font-family="Arial" font-size="12" fill="black">{text}</text>\n'
+        # (posición y texto guardados al mover la acotación, sin consultar al canvas;
+        # las líneas fuera de la vista no tienen acotación dibujada y se calcula aquí)
+        for line in self.lines:
+            if not line.get("dimension_visible", True):
+                continue
+            label_data = line.get("label")
+            if label_data is not None:
+                x, y = label_data['text_xy']
+                text = label_data['text_value']
+            else:
+                x, y = self._dimension_geometry(line["start"], line["end"])['text']
+                text = f"{line['length']:.2f} m"
+            yield _SVG_DIM_TEXT_FMT % (x, y, text)
 
         # Exportar etiquetas de texto personalizadas
         for label_data in self.text_labels:
@@ -1692,70 +2200,30 @@ class DrawingApp:
             angle = label_data.get('angle', 0)
             
             # Texto sin fondo
-            svg_content += f'  <text x="{x}" y="{y}" font-family="Arial" font-size="14" '
-            svg_content += f'font-weight="bold" fill="#333" text-anchor="middle" '
-            svg_content += f'alignment-baseline="middle" '
-            svg_content += f'transform="rotate({angle}, {x}, {y})">{text}</text>\n'
+            yield _SVG_LABEL_FMT % (x, y, angle, x, y, text)
 
         # Exportar rosa de los vientos
-        cx = canvas_width - self.compass_size - 20
-        cy = self.compass_size + 20
-        radius = self.compass_size // 2 - 10
-        
-        # Círculo de fondo
-        svg_content += f'  <circle cx="{cx}" cy="{cy}" r="{self.compass_size//2}" '
-        svg_content += f'fill="white" stroke="#333" stroke-width="2" />\n'
-        
-        # Línea Norte (roja)
-        svg_content += f'  <line x1="{cx}" y1="{cy}" x2="{cx}" y2="{cy - radius}" '
-        svg_content += f'stroke="red" stroke-width="3" marker-end="url(#arrowRed)" />\n'
-        svg_content += f'  <text x="{cx}" y="{cy - radius - 12}" '
-        svg_content += f'font-family="Arial" font-size="12" font-weight="bold" '
-        svg_content += f'fill="red" text-anchor="middle">N</text>\n'
-        
-        # Línea Sur
-        svg_content += f'  <line x1="{cx}" y1="{cy}" x2="{cx}" y2="{cy + radius}" '
-        svg_content += f'stroke="#666" stroke-width="2" />\n'
-        svg_content += f'  <text x="{cx}" y="{cy + radius + 12}" '
-        svg_content += f'font-family="Arial" font-size="10" fill="#666" text-anchor="middle">S</text>\n'
-        
-        # Línea Este
-        svg_content += f'  <line x1="{cx}" y1="{cy}" x2="{cx + radius}" y2="{cy}" '
-        svg_content += f'stroke="#666" stroke-width="2" />\n'
-        svg_content += f'  <text x="{cx + radius + 12}" y="{cy}" '
-        svg_content += f'font-family="Arial" font-size="10" fill="#666" '
-        svg_content += f'alignment-baseline="middle">E</text>\n'
-        
-        # Línea Oeste
-        svg_content += f'  <line x1="{cx}" y1="{cy}" x2="{cx - radius}" y2="{cy}" '
-        svg_content += f'stroke="#666" stroke-width="2" />\n'
-        svg_content += f'  <text x="{cx - radius - 12}" y="{cy}" '
-        svg_content += f'font-family="Arial" font-size="10" fill="#666" '
-        svg_content += f'text-anchor="end" alignment-baseline="middle">O</text>\n'
+        compass_size = self.compass_size
+        compass_half = compass_size // 2
+        cx = canvas_width - compass_size - 20
+        cy = compass_size + 20
+        radius = compass_half - 10
+        
+        # Todos los elementos de la rosa en una sola plantilla
+        yield _SVG_COMPASS_FMT % {
+            'cx': cx, 'cy': cy, 'r': compass_half,
+            'n_y': cy - radius, 'n_text_y': cy - radius - 12,
+            's_y': cy + radius, 's_text_y': cy + radius + 12,
+            'e_x': cx + radius, 'e_text_x': cx + radius + 12,
+            'o_x': cx - radius, 'o_text_x': cx - radius - 12,
+        }
         
         # Etiqueta de orientación si hay rotación
-        if self.rotation_angle != 0:
-            svg_content += f'  <text x="{cx}" y="{cy + self.compass_size//2 + 25}" '
-            svg_content += f'font-family="Arial" font-size="9" fill="#666" '
-            svg_content += f'text-anchor="middle">Rotación: {self.rotation_angle}°</text>\n'
-
-        svg_content += '</svg>'
+        rotation_angle = self.rotation_angle
+        if rotation_angle != 0:
+            yield _SVG_ROTATION_FMT % (cx, cy + compass_half + 25, rotation_angle)
 
-        # Escribir el contenido SVG en el archivo
-        try:
-            with open(file_path, "w", encoding="utf-8") as svg_file:
-                svg_file.write(svg_content)
-            
-            messagebox.showinfo(
-                "Exportación Exitosa",
-                f"✅ Archivo SVG guardado en:\n{file_path}\n\n"
-                f"Zonas exportadas: {len(self.zone_manager.get_all_zones())}\n"
-                f"Orientación: {self.rotation_angle}°"
-            )
-            print(f"Archivo SVG guardado correctamente en {file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al guardar el archivo SVG:\n{e}")
-            print(f"Error al guardar el archivo SVG: {e}")
+        yield '</svg>'
     
     # ============================================================================
     # MÉTODOS PARA GUARDADO Y CARGA DE PROYECTOS
@@ -1803,7 +2271,7 @@ class DrawingApp:
             'author': ''
         }
         self.update_window_title()
-        print("Nuevo proyecto creado")
+        log.debug("Nuevo proyecto creado")
     
     def save_project(self):
         """Guarda el proyecto actual."""
@@ -1848,8 +2316,7 @@ class DrawingApp:
                         'name': zone.name,
                         'type': zone.zone_type,
                         'line_indices': zone.line_indices,
-                        'area': zone.area,
-                        'perimeter': zone.perimeter
+                        'area': zone.area
                     }
                     for zone in self.zone_manager.get_all_zones()
                 ],
@@ -1887,11 +2354,11 @@ class DrawingApp:
                 f"Zonas: {len(self.zone_manager.get_all_zones())}\n"
                 f"Etiquetas: {len(self.text_labels)}"
             )
-            print(f"Proyecto guardado en: {file_path}")
+            log.debug("Proyecto guardado en: %s", file_path)
             
         except Exception as e:
             messagebox.showerror("Error al Guardar", f"No se pudo guardar el proyecto:\n{e}")
-            print(f"Error al guardar proyecto: {e}")
+            log.error("Error al guardar proyecto: %s", e)
     
     def open_project(self):
         """Abre un proyecto existente."""
@@ -1938,33 +2405,33 @@ class DrawingApp:
                 'author': metadata.get('author', '')
             }
             self.SCALE = metadata.get('scale', 50)
+            self._INV_SCALE = 1.0 / self.SCALE
+            self.zone_manager.scale = self.SCALE
             
             # Cargar líneas
             lines_data = project_data.get('lines', [])
             for line_data in lines_data:
-                line_obj = {
-                    'start': tuple(line_data['start']),
-                    'end': tuple(line_data['end']),
-                    'length': line_data['length'],
-                    'dimension_visible': line_data.get('dimension_visible', True),
-                    'line': None  # Se creará al redibujar
-                }
-                self.lines.append(line_obj)
+                # Los elementos del canvas se crearán al redibujar
+                self.lines.append(self._new_line_record(
+                    tuple(line_data['start']),
+                    tuple(line_data['end']),
+                    line_data['length'],
+                    dimension_visible=line_data.get('dimension_visible', True)
+                ))
+            self._lines_revision += 1
             
             # Cargar zonas
-            self.zone_manager.zones.clear()
+            self.zone_manager.clear_all_zones()
             zones_data = project_data.get('zones', [])
             for zone_data in zones_data:
-                # Recrear zonas usando el zone_manager
-                from zone_manager import Zone
-                zone = Zone(
-                    name=zone_data['name'],
-                    zone_type=zone_data['type'],
-                    line_indices=zone_data['line_indices']
+                # Recrear zonas usando el zone_manager (asigna IDs y recalcula
+                # validez y área a partir de las líneas cargadas)
+                self.zone_manager.create_zone(
+                    zone_data['name'],
+                    zone_data['type'],
+                    zone_data['line_indices'],
+                    self.lines
                 )
-                zone.area = zone_data.get('area', 0.0)
-                zone.perimeter = zone_data.get('perimeter', 0.0)
-                self.zone_manager.zones.append(zone)
             
             # Cargar etiquetas de texto
             text_labels_data = project_data.get('text_labels', [])
@@ -2009,14 +2476,14 @@ class DrawingApp:
                 f"Etiquetas: {len(self.text_labels)}\n"
                 f"Creado: {self.project_metadata.get('created', 'N/A')}"
             )
-            print(f"Proyecto cargado desde: {file_path}")
+            log.debug("Proyecto cargado desde: %s", file_path)
             
         except json.JSONDecodeError as e:
             messagebox.showerror("Error de Formato", f"El archivo no es un proyecto válido:\n{e}")
-            print(f"Error al leer JSON: {e}")
+            log.error("Error al leer JSON: %s", e)
         except Exception as e:
             messagebox.showerror("Error al Cargar", f"No se pudo cargar el proyecto:\n{e}")
-            print(f"Error al cargar proyecto: {e}")
+            log.error("Error al cargar proyecto: %s", e)
     
     def on_closing(self):
         """Maneja el cierre de la ventana."""
@@ -2032,27 +2499,53 @@ class DrawingApp:
                 if self.has_unsaved_changes:  # Si canceló el guardado
                     return
         
+        # No esperar a un análisis en curso: el resultado se descarta
+        if self._ai_executor is not None:
+            self._ai_executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Liberar las conexiones HTTP del analizador
+        if self.claude_analyzer is not None:
+            try:
+                self.claude_analyzer.close()
+            except Exception as e:
+                log.warning("No se pudo cerrar el analizador de Claude: %s", e)
+        
         self.root.destroy()
     
     def _initialize_claude(self):
-        """Inicializa el analizador de Claude cargando las variables de entorno."""
+        """
+        Inicializa el analizador de Claude cargando las variables de entorno.
+        
+        Importar el cliente de Anthropic es lento, así que se hace aquí, la primera
+        vez que se pide un análisis, y no al abrir la aplicación. El resultado
+        (también un fallo) se recuerda para no repetir el intento en cada clic.
+        """
+        self._claude_initialized = True
         try:
+            from claude_analyzer import ClaudeAnalyzer, load_env_file
+            
             # Cargar variables de entorno desde .env
             load_env_file('.env')
             
             # Intentar inicializar Claude
             self.claude_analyzer = ClaudeAnalyzer()
-            print("✓ Claude Analyzer inicializado correctamente")
+            log.debug("✓ Claude Analyzer inicializado correctamente")
             
-        except ValueError as e:
-            print(f"⚠️ Claude no disponible: {e}")
+        except (ValueError, ImportError) as e:
+            log.warning("⚠️ Claude no disponible: %s", e)
             self.claude_analyzer = None
         except Exception as e:
-            print(f"❌ Error al inicializar Claude: {e}")
+            log.error("❌ Error al inicializar Claude: %s", e)
             self.claude_analyzer = None
     
-    def analyze_with_ai(self):
-        """Ejecuta el análisis del plano con Claude AI."""
+    def analyze_with_ai(self, force_refresh=False):
+        """
+        Ejecuta el análisis del plano con Claude AI.
+        
+        Args:
+            force_refresh: Ignorar los análisis guardados (en memoria y en disco)
+                y volver a consultar a Claude
+        """
         # Verificar si hay líneas dibujadas
         if not self.lines:
             messagebox.showwarning(
@@ -2062,7 +2555,9 @@ class DrawingApp:
             )
             return
         
-        # Verificar si Claude está disponible
+        # Verificar si Claude está disponible (inicializándolo en el primer uso)
+        if not self._claude_initialized:
+            self._initialize_claude()
         if self.claude_analyzer is None:
             messagebox.showerror(
                 "Claude no disponible",
@@ -2074,12 +2569,55 @@ class DrawingApp:
             )
             return
         
-        # Mostrar ventana de "Analizando..."
+        # Obtener zonas en formato para Claude
+        zones_data = None
+        if self.zone_manager.get_all_zones():
+            zones_data = self.zone_manager.export_zones_data()
+        
+        # Copia de las líneas: el hilo de fondo no debe leer self.lines mientras
+        # la interfaz sigue pudiendo modificarlas
+        lines_snapshot = [
+            {'start': line['start'], 'end': line['end'], 'length': line['length']}
+            for line in self.lines
+        ]
+        
+        # Un plano idéntico ya analizado se muestra sin volver a llamar a la API
+        cache_key = self._ai_cache_key(lines_snapshot, zones_data)
+        cached = None if force_refresh else self._ai_cache.get(cache_key)
+        if cached is not None:
+            self._ai_cache.move_to_end(cache_key)
+            self._show_analysis_results(cached)
+            return
+        
+        # Mostrar ventana de "Analizando..." (se crea una vez y se reutiliza)
+        progress_window = self._get_progress_window()
+        progress_window.deiconify()
+        progress_window.lift()
+        progress_window.grab_set()
+        
+        # Realizar análisis en segundo plano para no bloquear el bucle de Tk
+        if self._ai_executor is None:
+            self._ai_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="claude")
+        future = self._ai_executor.submit(
+            self.claude_analyzer.analyze_floor_plan,
+            lines_snapshot,
+            self.SCALE,
+            zones_data,
+            force_refresh=force_refresh
+        )
+        self.root.after(100, self._poll_ai_analysis, future, progress_window, cache_key)
+    
+    def _get_progress_window(self):
+        """Devuelve la ventana de progreso del análisis, creándola oculta la primera vez."""
+        if self._progress_window is not None and self._progress_window.winfo_exists():
+            return self._progress_window
+        
         progress_window = tk.Toplevel(self.root)
         progress_window.title("Analizando...")
         progress_window.geometry("300x100")
         progress_window.transient(self.root)
-        progress_window.grab_set()
+        # El análisis no se puede cancelar: cerrar la ventana no debe destruirla
+        progress_window.protocol("WM_DELETE_WINDOW", lambda: None)
         
         tk.Label(
             progress_window, 
@@ -2087,37 +2625,54 @@ class DrawingApp:
             font=("Arial", 12)
         ).pack(pady=20)
         
-        progress_label = tk.Label(progress_window, text="Por favor espera...")
-        progress_label.pack()
+        tk.Label(progress_window, text="Por favor espera...").pack()
+        
+        progress_window.withdraw()
+        self._progress_window = progress_window
+        return progress_window
+    
+    def _ai_cache_key(self, lines, zones_data):
+        """Huella del plano (coordenadas redondeadas, longitudes, escala y zonas) para el caché de IA."""
+        canonical = json.dumps({
+            'scale': self.SCALE,
+            'lines': [
+                (round(line['start'][0], 2), round(line['start'][1], 2),
+                 round(line['end'][0], 2), round(line['end'][1], 2),
+                 round(line['length'], 3))
+                for line in lines
+            ],
+            'zones': zones_data
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()
+    
+    def _poll_ai_analysis(self, future, progress_window, cache_key):
+        """Comprueba desde el hilo de Tk si terminó el análisis y muestra el resultado."""
+        if not future.done():
+            self.root.after(100, self._poll_ai_analysis, future, progress_window, cache_key)
+            return
         
-        # Actualizar la interfaz
-        self.root.update()
+        # Ocultar ventana de progreso (se reutiliza en el próximo análisis)
+        progress_window.grab_release()
+        progress_window.withdraw()
         
         try:
-            # Obtener zonas en formato para Claude
-            zones_data = None
-            if self.zone_manager.get_all_zones():
-                zones_data = self.zone_manager.export_zones_data()
-            
-            # Realizar análisis
-            analysis = self.claude_analyzer.analyze_floor_plan(
-                self.lines, 
-                self.SCALE,
-                zones_data
-            )
-            
-            # Cerrar ventana de progreso
-            progress_window.destroy()
-            
-            # Mostrar resultados
-            self._show_analysis_results(analysis)
-            
+            analysis = future.result()
         except Exception as e:
-            progress_window.destroy()
             messagebox.showerror(
                 "Error en el análisis",
                 f"Ocurrió un error durante el análisis:\n\n{str(e)}"
             )
+            return
+        
+        # Recordar solo los análisis en los que Claude respondió correctamente
+        if analysis.get('claude_insights', {}).get('success'):
+            self._ai_cache[cache_key] = analysis
+            self._ai_cache.move_to_end(cache_key)
+            if len(self._ai_cache) > self.AI_CACHE_SIZE:
+                self._ai_cache.popitem(last=False)
+        
+        # Mostrar resultados
+        self._show_analysis_results(analysis)
     
     def _show_analysis_results(self, analysis: dict):
         """
@@ -2185,6 +2740,17 @@ class DrawingApp:
             command=save_report
         ).pack(side=tk.LEFT, padx=5)
         
+        # Pedir un análisis nuevo aunque el plano ya se haya analizado antes
+        def reanalyze():
+            results_window.destroy()
+            self.analyze_with_ai(force_refresh=True)
+        
+        tk.Button(
+            button_frame,
+            text="🔄 Reanalizar",
+            command=reanalyze
+        ).pack(side=tk.LEFT, padx=5)
+        
         tk.Button(
             button_frame,
             text="Cerrar",
@@ -2244,8 +2810,8 @@ class DrawingApp:
             return
         
         # Calcular centro del canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+        canvas_width = self._cw
+        canvas_height = self._ch
         center_x = canvas_width / 2
         center_y = canvas_height / 2
         
@@ -2264,7 +2830,7 @@ class DrawingApp:
         self.zoom_label.config(text=f"Zoom: {int(self.zoom_level * 100)}%")
         self.redraw_canvas()
         
-        print(f"Zoom ajustado a {int(self.zoom_level * 100)}%")
+        log.debug("Zoom ajustado a %s%%", int(self.zoom_level * 100))
     
     def start_pan(self, event):
         """Inicia el modo de desplazamiento (pan)."""
@@ -2385,33 +2951,22 @@ class DrawingApp:
         # Transformar coordenadas del canvas a coordenadas del mundo
         world_x, world_y = self._inverse_transform_point(event.x, event.y)
         
-        # Buscar línea cercana al clic (búsqueda mejorada)
-        closest_line = None
-        min_distance = float('inf')
-        tolerance = 20  # En píxeles del mundo
-        
-        for i, line_data in enumerate(self.lines):
-            # Usar las coordenadas directamente del dict line_data
-            x1, y1 = line_data["start"]
-            x2, y2 = line_data["end"]
-            
-            # Calcular distancia del punto a la línea (en coordenadas del mundo)
-            distance = self._distance_point_to_line(world_x, world_y, x1, y1, x2, y2)
-            
-            if distance < min_distance and distance <= tolerance:
-                min_distance = distance
-                closest_line = i
+        # Buscar la línea más cercana al clic (tolerancia de 20 píxeles del mundo),
+        # solo entre las líneas de las celdas vecinas
+        tolerance = 20
+        candidates = self._nearby_segments(world_x, world_y, tolerance)
+        closest_line = _nearest_segment(world_x, world_y, self.segment_terms, tolerance, candidates)
         
         # Si encontramos una línea cercana, seleccionarla/deseleccionarla
-        if closest_line is not None:
+        if closest_line >= 0:
             if closest_line in self.selected_lines_for_zone:
                 # Deseleccionar
                 self.selected_lines_for_zone.remove(closest_line)
-                print(f"Línea {closest_line} deseleccionada. Total: {len(self.selected_lines_for_zone)}")
+                log.debug("Línea %s deseleccionada. Total: %s", closest_line, len(self.selected_lines_for_zone))
             else:
                 # Seleccionar
                 self.selected_lines_for_zone.append(closest_line)
-                print(f"Línea {closest_line} seleccionada. Total: {len(self.selected_lines_for_zone)}")
+                log.debug("Línea %s seleccionada. Total: %s", closest_line, len(self.selected_lines_for_zone))
             
             # Actualizar texto del botón con contador
             self.create_zone_button.config(
@@ -2426,11 +2981,11 @@ class DrawingApp:
     def _distance_point_to_line(self, px, py, x1, y1, x2, y2):
         """Calcula la distancia mínima de un punto a un segmento de línea."""
         # Longitud del segmento al cuadrado
-        line_length_sq = (x2 - x1) ** 2 + (y2 - y1) ** 2
+        line_length_sq = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1)
         
         if line_length_sq == 0:
             # La línea es un punto
-            return math.sqrt((px - x1) ** 2 + (py - y1) ** 2)
+            return math.hypot(px - x1, py - y1)
         
         # Parámetro t del punto más cercano en la línea
         t = max(0, min(1, ((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / line_length_sq))
@@ -2440,7 +2995,7 @@ class DrawingApp:
         closest_y = y1 + t * (y2 - y1)
         
         # Distancia del punto al punto más cercano
-        distance = math.sqrt((px - closest_x) ** 2 + (py - closest_y) ** 2)
+        distance = math.hypot(px - closest_x, py - closest_y)
         
         return distance
     
@@ -2529,18 +3084,28 @@ class DrawingApp:
                 "Puedes crear zonas manualmente con 'Crear Zona'."
             )
     
+    def _zone_polygon(self, zone):
+        """
+        Vértices del polígono de una zona: el inicio de su primera línea y el final
+        de cada una, ignorando índices que ya no existen.
+        """
+        lines = self.lines
+        try:
+            # Los índices se validan al crear o actualizar la zona: normalmente todos existen
+            zone_lines = [lines[i] for i in zone.line_indices]
+        except IndexError:
+            # Zona que quedó apuntando a líneas borradas (p. ej. tras limpiar el canvas)
+            zone_lines = [lines[i] for i in zone.line_indices if i < len(lines)]
+        if not zone_lines:
+            return []
+        return [zone_lines[0]["start"], *[line["end"] for line in zone_lines]]
+    
     def visualize_zone(self, zone):
         """Visualiza una zona en el canvas."""
-        # Obtener las coordenadas del polígono
-        polygon_points = []
-        for line_idx in zone.line_indices:
-            if line_idx < len(self.lines):
-                line_data = self.lines[line_idx]
-                if not polygon_points:
-                    polygon_points.extend(line_data["start"])
-                polygon_points.extend(line_data["end"])
-        
-        if len(polygon_points) >= 6:  # Al menos 3 puntos (6 coordenadas)
+        # Obtener los vértices del polígono
+        polygon_points = self._zone_polygon(zone)
+        
+        if len(polygon_points) >= 3:
             # Crear polígono con relleno semitransparente
             polygon = self.canvas.create_polygon(
                 polygon_points,
@@ -2790,8 +3355,9 @@ class DrawingApp:
         # Verificar si Ctrl está presionado para deseleccionar
         ctrl_pressed = (event.state & 0x4) != 0
         
-        # Buscar línea cercana
-        for i, line in enumerate(self.lines):
+        # Buscar línea cercana (solo entre las de las celdas vecinas, en orden)
+        for i in self._nearby_segments(world_x, world_y, 10):
+            line = self.lines[i]
             distance = self._distance_point_to_line(world_x, world_y, *line["start"], *line["end"])
             if distance <= 10:  # Tolerancia de 10 píxeles
                 if ctrl_pressed:
@@ -3071,13 +3637,9 @@ class DrawingApp:
         if len(points) < 3:
             return 0.0
         
-        area = 0.0
-        n = len(points)
-        
-        for i in range(n):
-            j = (i + 1) % n
-            area += points[i][0] * points[j][1]
-            area -= points[j][0] * points[i][1]
+        # Recorrer cada vértice junto al siguiente (lista rotada) sin módulo por iteración
+        next_points = points[1:] + points[:1]
+        area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, next_points))
         
         area = abs(area) / 2.0
         
@@ -3098,8 +3660,7 @@ class DrawingApp:
             j = (i + 1) % n
             dx = points[j][0] - points[i][0]
             dy = points[j][1] - points[i][1]
-            distance = math.sqrt(dx * dx + dy * dy)
-            perimeter += distance
+            perimeter += math.hypot(dx, dy)
         
         # Convertir de píxeles a metros
         perimeter_m = perimeter / self.SCALE
@@ -3245,7 +3806,7 @@ class ZoneDialog:
         
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("Crear Zona")
-        self.dialog.geometry("400x300")
+        self.dialog.geometry("400x320")
         self.dialog.resizable(False, False)
         
         # Centrar diálogo
@@ -3263,6 +3824,10 @@ class ZoneDialog:
         self.name_entry.pack(pady=5)
         self.name_entry.focus()
         
+        # Mensaje de validación en línea (evita abrir un messagebox modal)
+        self.error_label = tk.Label(self.dialog, text="", fg="red", font=("Arial", 9))
+        self.error_label.pack()
+        
         # Tipo de zona
         tk.Label(
             self.dialog,
@@ -3335,10 +3900,8 @@ class ZoneDialog:
         name = self.name_entry.get().strip()
         
         if not name:
-            messagebox.showwarning(
-                "Nombre Requerido",
-                "Debes ingresar un nombre para la zona."
-            )
+            self.error_label.config(text="Debes ingresar un nombre para la zona.")
+            self.name_entry.focus_set()
             return
         
         self.result = {
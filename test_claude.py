@@ -5,8 +5,18 @@ Ejecuta un análisis simulado sin necesidad de la interfaz gráfica.
 
 from claude_analyzer import ClaudeAnalyzer, load_env_file
 from geometry_utils import GeometryUtils
+from types import MappingProxyType
 import os
 
+# Plano de ejemplo (rectángulo de 10m x 8m con punto inicial (50, 50)), creado una
+# sola vez al importar y de solo lectura para poder reutilizarlo en cada prueba
+_SAMPLE_PLAN = tuple(MappingProxyType(line) for line in [
+    {'start': (50, 50), 'end': (550, 50), 'length': 10.0},      # Línea superior
+    {'start': (550, 50), 'end': (550, 450), 'length': 8.0},     # Línea derecha
+    {'start': (550, 450), 'end': (50, 450), 'length': 10.0},    # Línea inferior
+    {'start': (50, 450), 'end': (50, 50), 'length': 8.0}        # Línea izquierda
+])
+
 def test_claude_integration():
     """Prueba básica de la integración con Claude."""
     
@@ -36,13 +46,7 @@ def test_claude_integration():
     print("2. Creando plano de ejemplo (rectángulo de 10m x 8m)...")
     scale = 50  # 1 metro = 50 píxeles
     
-    # Rectángulo: punto inicial (50, 50)
-    lines = [
-        {'start': (50, 50), 'end': (550, 50), 'length': 10.0},      # Línea superior
-        {'start': (550, 50), 'end': (550, 450), 'length': 8.0},     # Línea derecha
-        {'start': (550, 450), 'end': (50, 450), 'length': 10.0},    # Línea inferior
-        {'start': (50, 450), 'end': (50, 50), 'length': 8.0}        # Línea izquierda
-    ]
+    lines = _SAMPLE_PLAN
     
     print(f"✓ Plano creado con {len(lines)} líneas")
     print()
@@ -0,0 +1,52 @@
+"""
+Prueba de guardado y carga de proyectos (ida y vuelta) sin interfaz gráfica.
+"""
+
+import os
+import tempfile
+from unittest import mock
+
+import main
+
+
+def _make_app():
+    """Crea la aplicación con widgets simulados (no requiere pantalla)."""
+    def setup_ui(self):
+        for name in ('canvas', 'zone_listbox', 'zone_summary_label', 'delete_zone_button',
+                     'orientation_label', 'zoom_label', 'fixed_movement_button'):
+            setattr(self, name, mock.MagicMock())
+    
+    with mock.patch.object(main.DrawingApp, 'setup_ui', setup_ui):
+        return main.DrawingApp(mock.MagicMock())
+
+
+def test_project_round_trip():
+    """Un proyecto con líneas, zonas y etiquetas se recupera igual al cargarlo."""
+    app = _make_app()
+    corners = [(100, 100), (350, 100), (350, 300), (100, 300)]
+    for i, start in enumerate(corners):
+        end = corners[(i + 1) % len(corners)]
+        app.lines.append(app._new_line_record(start, end, app.calculate_length(start, end)))
+    app._lines_revision += 1
+    zone = app.zone_manager.create_zone("Sala", "sala", [0, 1, 2, 3], app.lines)
+    app.text_labels.append({'text': "Norte", 'x': 10, 'y': 20, 'angle': 45})
+    
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(main, 'messagebox') as msg:
+        file_path = os.path.join(tmp_dir, "plano.drawapp")
+        app._save_to_file(file_path)
+        
+        loaded = _make_app()
+        loaded._load_from_file(file_path)
+        
+        msg.showerror.assert_not_called()
+    
+    assert [(line['start'], line['end'], line['length']) for line in loaded.lines] == \
+        [(line['start'], line['end'], line['length']) for line in app.lines]
+    
+    zones = loaded.zone_manager.get_all_zones()
+    assert len(zones) == 1
+    assert (zones[0].name, zones[0].zone_type, zones[0].line_indices) == ("Sala", "sala", [0, 1, 2, 3])
+    assert zones[0].is_valid and abs(zones[0].area - zone.area) < 1e-9
+    
+    assert [(t['text'], t['x'], t['y'], t['angle']) for t in loaded.text_labels] == [("Norte", 10, 20, 45)]
+    assert loaded.current_file == file_path and not loaded.has_unsaved_changes
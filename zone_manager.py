@@ -3,14 +3,44 @@ Gestor de zonas para planos de inmuebles.
 Permite crear, editar y gestionar zonas/habitaciones en el plano.
 """
 
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Sequence
+from collections import defaultdict, OrderedDict
+from operator import itemgetter
 import random
+import sys
 from geometry_utils import GeometryUtils
 
 
+# Colores pastel ya generados; se rellena por lotes para no llamar al generador
+# aleatorio y formatear cada color por separado
+_PASTEL_POOL: List[str] = []
+_PASTEL_BATCH = 256
+
+
+def _next_pastel_color() -> str:
+    """Saca un color pastel aleatorio del lote, generando otro lote si se agotó."""
+    if not _PASTEL_POOL:
+        channels = random.choices(range(180, 256), k=3 * _PASTEL_BATCH)
+        _PASTEL_POOL.extend(
+            '#%02x%02x%02x' % (channels[i], channels[i + 1], channels[i + 2])
+            for i in range(0, len(channels), 3)
+        )
+    return _PASTEL_POOL.pop()
+
+
+def _pick_lines(all_lines: List[Dict], indices: List[int]) -> List[Dict]:
+    """Devuelve las líneas de los índices dados (ya validados) indexando en C."""
+    if len(indices) > 1:
+        return list(itemgetter(*indices)(all_lines))
+    return [all_lines[i] for i in indices]
+
+
 class Zone:
     """Representa una zona o habitación en el plano."""
     
+    # Atributos fijos: sin __dict__ por instancia, menos memoria y acceso directo
+    __slots__ = ('id', 'name', 'zone_type', 'line_indices', 'color', 'area', 'is_valid', '_centroid')
+    
     def __init__(self, zone_id: int, name: str, zone_type: str, 
                  line_indices: List[int], color: str = None):
         """
@@ -25,18 +55,18 @@ class Zone:
         """
         self.id = zone_id
         self.name = name
-        self.zone_type = zone_type
+        # Internado: las búsquedas por tipo comparan por identidad con las claves
+        self.zone_type = sys.intern(zone_type)
         self.line_indices = line_indices
-        self.color = color or self._generate_pastel_color()
+        self.color = color  # Quien crea la zona decide el color (ver ZoneManager)
         self.area = 0.0  # Se calcula después
         self.is_valid = False  # Se valida después
+        self._centroid = None  # (huella de la geometría, centroide) del último cálculo
     
-    def _generate_pastel_color(self) -> str:
+    @staticmethod
+    def _generate_pastel_color() -> str:
         """Genera un color pastel aleatorio para la zona."""
-        r = random.randint(180, 255)
-        g = random.randint(180, 255)
-        b = random.randint(180, 255)
-        return f'#{r:02x}{g:02x}{b:02x}'
+        return _next_pastel_color()
     
     def to_dict(self) -> Dict:
         """Convierte la zona a diccionario."""
@@ -71,6 +101,14 @@ class ZoneManager:
         'otro': {'icon': '📐', 'color': '#F0F0F0'}
     }
     
+    # Color e ícono por tipo en diccionarios planos: una sola búsqueda por consulta
+    _COLORS = {zone_type: info['color'] for zone_type, info in ZONE_TYPES.items()}
+    _ICONS = {zone_type: info['icon'] for zone_type, info in ZONE_TYPES.items()}
+    
+    # Máximo de resultados memorizados por caché de geometría (se descartan los
+    # usados hace más tiempo)
+    GEOMETRY_CACHE_SIZE = 256
+    
     def __init__(self, scale: float = 50):
         """
         Inicializa el gestor de zonas.
@@ -82,6 +120,70 @@ class ZoneManager:
         self.scale = scale
         self.next_id = 1
         self.geo_utils = GeometryUtils()
+        
+        # Índices para búsquedas O(1); self.zones conserva el orden de creación
+        self._by_id: Dict[int, Zone] = {}
+        self._line_index: Dict[int, int] = {}  # Índice de línea -> id de la primera zona que la usa
+        
+        # Resultados de validación y área por geometría (LRU): si las líneas de una
+        # zona no cambiaron, no se vuelven a ordenar ni a medir
+        self._validation_cache: OrderedDict = OrderedDict()
+        self._area_cache: OrderedDict = OrderedDict()
+    
+    @staticmethod
+    def _geometry_key(line_indices: List[int], zone_lines: List[Dict]) -> tuple:
+        """Huella de una zona: sus índices de línea y las coordenadas de esas líneas."""
+        return (
+            tuple(line_indices),
+            tuple((tuple(line['start']), tuple(line['end'])) for line in zone_lines)
+        )
+    
+    def _cached(self, cache: OrderedDict, cache_key: tuple, compute):
+        """Devuelve el valor memorizado en `cache` o lo calcula y lo guarda (LRU)."""
+        value = cache.get(cache_key)
+        if value is not None:
+            cache.move_to_end(cache_key)
+            return value
+        value = compute()
+        cache[cache_key] = value
+        if len(cache) > self.GEOMETRY_CACHE_SIZE:
+            cache.popitem(last=False)
+        return value
+    
+    def _is_closed(self, key: tuple, zone_lines: List[Dict], tolerance: float) -> bool:
+        """validate_zone_closure con caché por huella y tolerancia."""
+        return self._cached(
+            self._validation_cache, (tolerance, key),
+            lambda: self.geo_utils.validate_zone_closure(zone_lines, tolerance=tolerance)
+        )
+    
+    def _zone_area(self, key: tuple, zone_lines: List[Dict]) -> float:
+        """calculate_zone_area con caché por huella y escala."""
+        return self._cached(
+            self._area_cache, (self.scale, key),
+            lambda: self.geo_utils.calculate_zone_area(zone_lines, self.scale)
+        )
+    
+    def _rebuild_line_index(self):
+        """Reconstruye el índice de líneas respetando el orden de las zonas."""
+        self._line_index = {}
+        for zone in self.zones:
+            for line_index in zone.line_indices:
+                self._line_index.setdefault(line_index, zone.id)
+    
+    def add_zone(self, zone: Zone):
+        """
+        Agrega una zona ya construida (por ejemplo, al cargar un proyecto)
+        manteniendo los índices y el siguiente ID disponible.
+        
+        Args:
+            zone: Zona a agregar
+        """
+        self.zones.append(zone)
+        self._by_id[zone.id] = zone
+        for line_index in zone.line_indices:
+            self._line_index.setdefault(line_index, zone.id)
+        self.next_id = max(self.next_id, zone.id + 1)
     
     def create_zone(self, name: str, zone_type: str, line_indices: List[int], 
                     all_lines: List[Dict]) -> Optional[Zone]:
@@ -100,24 +202,31 @@ class ZoneManager:
         if not line_indices:
             return None
         
-        # Obtener las líneas de la zona
-        zone_lines = [all_lines[i] for i in line_indices if i < len(all_lines)]
+        # Guardar solo los índices de líneas existentes, así quien recorra la zona
+        # no tiene que volver a comprobarlos
+        line_indices = [i for i in line_indices if i < len(all_lines)]
+        zone_lines = _pick_lines(all_lines, line_indices)
         
         if len(zone_lines) < 3:
             return None
         
-        # Crear la zona
-        color = self.ZONE_TYPES.get(zone_type, {}).get('color')
+        # Validar y calcular área (reutilizando resultados si la geometría no cambió)
+        key = self._geometry_key(line_indices, zone_lines)
+        is_valid = self._is_closed(key, zone_lines, 20.0)
+        area = self._zone_area(key, zone_lines) if is_valid else 0.0
+        
+        return self._create_zone_unchecked(name, zone_type, line_indices, is_valid, area)
+    
+    def _create_zone_unchecked(self, name: str, zone_type: str, line_indices: List[int],
+                               is_valid: bool, area: float) -> Zone:
+        """Crea y registra una zona con validez y área ya calculadas por quien llama."""
+        # Solo se recurre al color aleatorio si el tipo no tiene uno fijo
+        color = self._COLORS.get(zone_type) or Zone._generate_pastel_color()
         zone = Zone(self.next_id, name, zone_type, line_indices, color)
         self.next_id += 1
-        
-        # Validar y calcular área
-        zone.is_valid = self.geo_utils.validate_zone_closure(zone_lines, tolerance=20.0)
-        
-        if zone.is_valid:
-            zone.area = self.geo_utils.calculate_zone_area(zone_lines, self.scale)
-        
-        self.zones.append(zone)
+        zone.is_valid = is_valid
+        zone.area = area
+        self.add_zone(zone)
         return zone
     
     def delete_zone(self, zone_id: int) -> bool:
@@ -130,11 +239,13 @@ class ZoneManager:
         Returns:
             True si se eliminó exitosamente
         """
-        for i, zone in enumerate(self.zones):
-            if zone.id == zone_id:
-                del self.zones[i]
-                return True
-        return False
+        zone = self._by_id.pop(zone_id, None)
+        if zone is None:
+            return False
+        self.zones.remove(zone)
+        # Sus líneas pueden pertenecer también a otra zona, que pasa a ser la primera
+        self._rebuild_line_index()
+        return True
     
     def update_zone(self, zone_id: int, name: str = None, zone_type: str = None,
                    line_indices: List[int] = None, all_lines: List[Dict] = None) -> bool:
@@ -159,67 +270,82 @@ class ZoneManager:
             zone.name = name
         
         if zone_type:
-            zone.zone_type = zone_type
-            zone.color = self.ZONE_TYPES.get(zone_type, {}).get('color') or zone.color
+            zone.zone_type = sys.intern(zone_type)
+            zone.color = self._COLORS.get(zone_type) or zone.color
         
         if line_indices and all_lines:
+            # Como en create_zone: guardar solo los índices de líneas existentes
+            line_count = len(all_lines)
+            line_indices = [i for i in line_indices if i < line_count]
             zone.line_indices = line_indices
-            zone_lines = [all_lines[i] for i in line_indices if i < len(all_lines)]
-            zone.is_valid = self.geo_utils.validate_zone_closure(zone_lines, tolerance=20.0)
+            self._rebuild_line_index()
+            zone_lines = _pick_lines(all_lines, line_indices)
+            key = self._geometry_key(line_indices, zone_lines)
+            zone.is_valid = self._is_closed(key, zone_lines, 20.0)
             if zone.is_valid:
-                zone.area = self.geo_utils.calculate_zone_area(zone_lines, self.scale)
+                zone.area = self._zone_area(key, zone_lines)
         
         return True
     
     def get_zone(self, zone_id: int) -> Optional[Zone]:
         """Obtiene una zona por su ID."""
-        for zone in self.zones:
-            if zone.id == zone_id:
-                return zone
-        return None
+        return self._by_id.get(zone_id)
     
     def get_zone_by_line(self, line_index: int) -> Optional[Zone]:
         """Obtiene la zona que contiene una línea específica."""
-        for zone in self.zones:
-            if line_index in zone.line_indices:
-                return zone
-        return None
+        zone_id = self._line_index.get(line_index)
+        return None if zone_id is None else self._by_id.get(zone_id)
     
-    def get_all_zones(self) -> List[Zone]:
-        """Retorna todas las zonas."""
-        return self.zones.copy()
+    def get_all_zones(self, copy: bool = False) -> Sequence[Zone]:
+        """
+        Retorna todas las zonas.
+        
+        Args:
+            copy: Si es True devuelve una tupla independiente; si no, la lista
+                interna del gestor (no modificarla ni iterarla mientras se
+                crean o eliminan zonas)
+        
+        Returns:
+            Zonas en orden de creación
+        """
+        return tuple(self.zones) if copy else self.zones
     
-    def get_zones_summary(self) -> Dict:
+    def get_zones_summary(self, include_list: bool = True) -> Dict:
         """
         Genera un resumen de todas las zonas.
         
+        Args:
+            include_list: Si es False no se incluye 'zones_list' (evita convertir
+                cada zona a diccionario cuando solo se necesitan los totales)
+        
         Returns:
             Diccionario con estadísticas de las zonas
         """
-        total_area = sum(z.area for z in self.zones if z.is_valid)
-        zone_count = len(self.zones)
-        valid_zones = sum(1 for z in self.zones if z.is_valid)
+        total_area = 0.0
+        valid_zones = 0
+        zones_by_type = defaultdict(lambda: {'count': 0, 'total_area': 0.0, 'zones': []})
         
-        zones_by_type = {}
+        # Una sola pasada para los totales y la agrupación por tipo
         for zone in self.zones:
-            if zone.zone_type not in zones_by_type:
-                zones_by_type[zone.zone_type] = {
-                    'count': 0,
-                    'total_area': 0.0,
-                    'zones': []
-                }
-            zones_by_type[zone.zone_type]['count'] += 1
-            zones_by_type[zone.zone_type]['total_area'] += zone.area
-            zones_by_type[zone.zone_type]['zones'].append(zone.name)
+            if zone.is_valid:
+                total_area += zone.area
+                valid_zones += 1
+            by_type = zones_by_type[zone.zone_type]
+            by_type['count'] += 1
+            by_type['total_area'] += zone.area
+            by_type['zones'].append(zone.name)
         
-        return {
+        zone_count = len(self.zones)
+        summary = {
             'total_zones': zone_count,
             'valid_zones': valid_zones,
             'invalid_zones': zone_count - valid_zones,
             'total_area': round(total_area, 2),
-            'zones_by_type': zones_by_type,
-            'zones_list': [z.to_dict() for z in self.zones]
+            'zones_by_type': dict(zones_by_type)
         }
+        if include_list:
+            summary['zones_list'] = [z.to_dict() for z in self.zones]
+        return summary
     
     def get_zone_centroid(self, zone_id: int, all_lines: List[Dict]) -> Optional[Tuple[float, float]]:
         """
@@ -236,11 +362,19 @@ class ZoneManager:
         if not zone:
             return None
         
-        zone_lines = [all_lines[i] for i in zone.line_indices if i < len(all_lines)]
+        line_count = len(all_lines)
+        zone_lines = _pick_lines(all_lines, [i for i in zone.line_indices if i < line_count])
         if not zone_lines:
             return None
         
-        return self.geo_utils.get_zone_centroid(zone_lines)
+        # Las líneas se pueden mover sin pasar por el gestor: el centroide guardado
+        # solo vale si la huella de la geometría sigue siendo la misma
+        key = self._geometry_key(zone.line_indices, zone_lines)
+        if zone._centroid is not None and zone._centroid[0] == key:
+            return zone._centroid[1]
+        centroid = self.geo_utils.get_zone_centroid(zone_lines)
+        zone._centroid = (key, centroid)
+        return centroid
     
     def auto_detect_zones(self, all_lines: List[Dict]) -> List[Zone]:
         """
@@ -253,33 +387,32 @@ class ZoneManager:
             Lista de zonas detectadas automáticamente
         """
         detected_zones = []
-        used_lines = set()
-        
-        for i, line in enumerate(all_lines):
-            if i in used_lines:
-                continue
-            
-            # Buscar líneas conectadas
-            connected = self.geo_utils.find_connected_lines(all_lines, i, tolerance=10.0)
-            
+        
+        # Todas las componentes conectadas de una vez (cada línea pertenece a una sola,
+        # así que ninguna candidata comparte líneas con otra)
+        for connected, zone_lines in self.geo_utils.find_all_components(all_lines, tolerance=10.0):
             if len(connected) >= 3:
-                zone_lines = [all_lines[idx] for idx in connected]
+                key = self._geometry_key(connected, zone_lines)
                 
                 # Verificar si forma un polígono cerrado
-                if self.geo_utils.validate_zone_closure(zone_lines, tolerance=10.0):
-                    # Crear zona auto-detectada
+                if self._is_closed(key, zone_lines, 10.0):
+                    # Crear zona auto-detectada: cerrada con tolerancia 10 también lo
+                    # está con la de 20 de create_zone, no hace falta volver a validarla
                     zone_name = f"Zona {len(detected_zones) + 1}"
-                    zone = self.create_zone(zone_name, 'otro', connected, all_lines)
-                    
-                    if zone:
-                        detected_zones.append(zone)
-                        used_lines.update(connected)
+                    zone = self._create_zone_unchecked(
+                        zone_name, 'otro', connected, True, self._zone_area(key, zone_lines)
+                    )
+                    detected_zones.append(zone)
         
         return detected_zones
     
     def clear_all_zones(self):
         """Elimina todas las zonas."""
         self.zones.clear()
+        self._by_id.clear()
+        self._line_index.clear()
+        self._validation_cache.clear()
+        self._area_cache.clear()
         self.next_id = 1
     
     def get_zone_label(self, zone: Zone) -> str:
@@ -292,7 +425,7 @@ class ZoneManager:
         Returns:
             Texto de la etiqueta
         """
-        icon = self.ZONE_TYPES.get(zone.zone_type, {}).get('icon', '📐')
+        icon = self._ICONS.get(zone.zone_type, '📐')
         return f"{icon} {zone.name}\n{zone.area:.2f} m²"
     
     def export_zones_data(self) -> List[Dict]:
@@ -309,16 +442,22 @@ class ZoneManager:
         """
         self.clear_all_zones()
         
-        for data in zones_data:
+        # Siguiente ID calculado una sola vez, no zona por zona
+        self.next_id = max((data['id'] for data in zones_data), default=0) + 1
+        
+        zones = [None] * len(zones_data)
+        for position, data in enumerate(zones_data):
             zone = Zone(
                 data['id'],
                 data['name'],
                 data['type'],
                 data['line_indices'],
-                data.get('color')
+                data.get('color') or Zone._generate_pastel_color()
             )
             zone.area = data.get('area', 0.0)
             zone.is_valid = data.get('is_valid', False)
-            
-            self.zones.append(zone)
-            self.next_id = max(self.next_id, zone.id + 1)
+            zones[position] = zone
+        
+        self.zones.extend(zones)
+        self._by_id = {zone.id: zone for zone in zones}
+        self._rebuild_line_index()